@@ -1,3 +1,4 @@
+import gzip
 import hashlib
 import json
 import logging
@@ -6,7 +7,7 @@ import time
 import urllib.parse
 from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Any, Awaitable, Callable, Union
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Union
 from urllib.parse import urlencode
 
 import redis.asyncio as redis
@@ -14,42 +15,66 @@ from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, status
 from pydantic import BaseModel
 from redis.asyncio.retry import Retry
 from redis.backoff import ExponentialBackoff
-from redis.exceptions import BusyLoadingError, ConnectionError, TimeoutError
+from redis.exceptions import (
+    BusyLoadingError,
+    ConnectionError,
+    LockError,
+    TimeoutError,
+)
 
 from ..config import settings
 
 retry = Retry(ExponentialBackoff(), 3)
 
+# cached payloads are gzip-compressed, served as is to clients accepting gzip
+CACHE_COMPRESSION_LEVEL = 6
+
+# longest computation of a payload holding the lock, and longest wait for it
+CACHE_LOCK_TIMEOUT = 300
+CACHE_LOCK_WAIT = 60
+
+CACHE_METRICS_PREFIX = "cache-metrics__"
+
+
+def create_redis_client(decode_responses: bool = True) -> redis.Redis:
+    dsn = settings.REDIS_DSN
+    is_secure = dsn.scheme == "rediss"
+
+    assert dsn.host
+    assert dsn.port
+    assert dsn.path
+
+    return redis.Redis(
+        host=dsn.host,
+        port=dsn.port,
+        username=dsn.username,
+        password=urllib.parse.unquote(dsn.password) if dsn.password else None,
+        db=int(re.sub("\D", "", dsn.path)),
+        ssl=is_secure,
+        decode_responses=decode_responses,
+        auto_close_connection_pool=True,
+        health_check_interval=3,
+        retry=retry,
+        retry_on_error=[BusyLoadingError, ConnectionError, TimeoutError],
+    )
+
 
 @asynccontextmanager
 async def create_redis_pool(application: FastAPI, *args, **kw):
     if not getattr(application.state, "redis", None):
-        dsn = settings.REDIS_DSN
-        is_secure = dsn.scheme == "rediss"
-
-        assert dsn.host
-        assert dsn.port
-        assert dsn.path
-
-        application.state.redis = redis.Redis(
-            host=dsn.host,
-            port=dsn.port,
-            username=dsn.username,
-            password=urllib.parse.unquote(dsn.password) if dsn.password else None,
-            db=int(re.sub("\D", "", dsn.path)),
-            ssl=is_secure,
-            decode_responses=True,
-            auto_close_connection_pool=True,
-            health_check_interval=3,
-            retry=retry,
-            retry_on_error=[BusyLoadingError, ConnectionError, TimeoutError],
-        )
+        application.state.redis = create_redis_client()
+
+    # binary payloads, e.g. vector tiles, must not be decoded
+    if not getattr(application.state, "redis_raw", None):
+        application.state.redis_raw = create_redis_client(decode_responses=False)
 
     try:
         yield
     finally:
         if getattr(application.state, "redis", None):
             await application.state.redis.close()
+        if getattr(application.state, "redis_raw", None):
+            await application.state.redis_raw.close()
 
 
 def get_redis(request: Union[Request, WebSocket]) -> redis.Redis:
@@ -58,18 +83,159 @@ def get_redis(request: Union[Request, WebSocket]) -> redis.Redis:
     return request.app.state.redis
 
 
+def get_redis_raw(request: Union[Request, WebSocket]) -> redis.Redis:
+    return request.app.state.redis_raw
+
+
+def build_cache_key(
+    callable: Callable, cache_suffix: Any, args: Tuple[Any, ...], kw: Dict[str, Any]
+) -> str:
+    arg_suffix = urlencode(
+        [(i, str(x)) for i, x in enumerate(args)] + [(k, str(v)) for k, v in kw.items()]
+    )
+    return f"{callable.__module__}__{callable.__qualname__}__{arg_suffix}__{cache_suffix}".lower()
+
+
 class DateTimeEncoder(json.JSONEncoder):
     def default(self, o):
         if isinstance(o, datetime):
             return o.isoformat()
 
 
-async def cached_json_response(request: Request):
-    cache: redis.Redis = get_redis(request)
+async def cache_get(cache: redis.Redis, key: str) -> Optional[bytes]:
+    try:
+        return await cache.get(key)
+    except Exception as e:
+        logging.error(f"Failed to get redis key {key}")
+        logging.exception(e)
+    return None
+
+
+async def record_cache_metrics(cache: redis.Redis, endpoint: str, **counters: int):
+    """Increment counters of cached endpoint, e.g. hits, misses or compute time"""
+    try:
+        pipe = cache.pipeline(transaction=False)
+        for k, v in counters.items():
+            pipe.hincrby(f"{CACHE_METRICS_PREFIX}{endpoint}", k, v)
+        await pipe.execute()
+    except Exception as e:
+        logging.error(f"Failed to record cache metrics of {endpoint}")
+        logging.exception(e)
+
 
+async def resolve_cached_payload(
+    request: Request,
+    cache_key: str,
+    endpoint: str,
+    compute: Callable[[], Awaitable[bytes]],
+    ttl: int = 0,
+) -> bytes:
+    """
+    Get gzip-compressed payload from cache or compute and store it.
+
+    Concurrent requests of missing key wait for the one which holds the lock
+    and computes the payload, instead of computing it as well.
+    """
+    cache: redis.Redis = get_redis_raw(request)
+    payload_key = f"{cache_key}__gz"
+
+    if ttl > 0:
+        payload = await cache_get(cache, payload_key)
+        if payload is not None:
+            await record_cache_metrics(cache, endpoint, hits=1)
+            return payload
+
+    async def compute_and_store() -> bytes:
+        now = time.time()
+        payload = gzip.compress(await compute(), compresslevel=CACHE_COMPRESSION_LEVEL)
+        elapsed = time.time() - now
+        logging.info(f"computed new cache for {cache_key} in {elapsed}s")
+
+        oversize = len(payload) > settings.CACHE_MAX_PAYLOAD_SIZE
+        if oversize:
+            logging.warning(
+                f"Payload of {cache_key} is {len(payload)} bytes, not cached"
+            )
+        elif ttl > 0:
+            # do not use server-side cache, but keep ETag
+            try:
+                await cache.set(payload_key, payload, ex=ttl)
+            except Exception as e:
+                logging.error(f"Failed to set redis key {cache_key}")
+                logging.exception(e)
+
+        await record_cache_metrics(
+            cache,
+            endpoint,
+            misses=1,
+            compute_ms=int(elapsed * 1000),
+            payload_bytes=len(payload),
+            oversize=int(oversize),
+        )
+        return payload
+
+    if ttl <= 0:
+        return await compute_and_store()
+
+    lock = cache.lock(
+        f"{payload_key}__lock",
+        timeout=CACHE_LOCK_TIMEOUT,
+        blocking_timeout=CACHE_LOCK_WAIT,
+    )
+    acquired = False
+    try:
+        acquired = await lock.acquire()
+    except Exception as e:
+        logging.error(f"Failed to acquire lock of {cache_key}")
+        logging.exception(e)
+
+    try:
+        # computed by concurrent request while waiting for the lock
+        payload = await cache_get(cache, payload_key)
+        if payload is not None:
+            await record_cache_metrics(cache, endpoint, hits=1, lock_waits=1)
+            return payload
+
+        return await compute_and_store()
+    finally:
+        if acquired:
+            try:
+                await lock.release()
+            except LockError:
+                logging.warning(f"Lock of {cache_key} expired during computation")
+
+
+def accepts_gzip(request: Request) -> bool:
+    return "gzip" in request.headers.get("accept-encoding", "").lower()
+
+
+def representation_etag(request: Request, etag: str) -> str:
+    """ETag of payload as served, gzip and identity encodings differ in bytes"""
+    return f"{etag}-gz" if accepts_gzip(request) else etag
+
+
+def compressed_response(
+    request: Request, payload: bytes, media_type: str, etag: str
+) -> Response:
+    headers = {"ETag": representation_etag(request, etag), "Vary": "Accept-Encoding"}
+
+    if accepts_gzip(request):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=payload, media_type=media_type, headers=headers)
+
+    return Response(
+        content=gzip.decompress(payload), media_type=media_type, headers=headers
+    )
+
+
+def cache_endpoint_name(callable: Callable) -> str:
+    return f"{callable.__module__}.{callable.__qualname__}"
+
+
+async def cached_json_response(request: Request):
     async def resolve(
         cache_suffix: str,
-        callable: Callable[[Any], Awaitable[Union[dict, list]]],
+        callable: Callable[[Any], Awaitable[Union[dict, list, str]]],
         ttl: int = 0,
         *args: Any,
         **kw: Any,
@@ -80,43 +246,68 @@ async def cached_json_response(request: Request):
                 detail=f"Attempt to cache response for method {request.method}",
             )
 
-        arg_suffix = urlencode(
-            [(i, str(x)) for i, x in enumerate(args)]
-            + [(k, str(v)) for k, v in kw.items()]
-        )
-        cache_key = f"{callable.__module__}__{callable.__qualname__}__{arg_suffix}__{cache_suffix}".lower()
+        cache_key = build_cache_key(callable, cache_suffix, args, kw)
         etag = hashlib.sha1(cache_key.encode()).hexdigest()
 
-        if request.headers.get("if-none-match", None) == etag:
+        if request.headers.get("if-none-match") == representation_etag(request, etag):
             return Response(status_code=status.HTTP_304_NOT_MODIFIED)
 
-        result = None
-        try:
-            result = await cache.get(cache_key)
-        except Exception as e:
-            logging.error(f"Failed to get redis key {cache_key}")
-            logging.exception(e)
+        async def compute() -> bytes:
+            result = await callable(*args, **kw)
 
-        if not result:
-            now = time.time()
-            _result = await callable(*args, **kw)
-            logging.info(f"computed new cache for {cache_key} in {time.time() - now}s")
+            if isinstance(result, BaseModel):
+                return result.model_dump_json(by_alias=True).encode()
+            elif isinstance(result, str):
+                # already serialized, e.g. by database
+                return result.encode()
+            return json.dumps(result, cls=DateTimeEncoder).encode()
 
-            try:
-                if isinstance(_result, BaseModel):
-                    result = _result.model_dump_json(by_alias=True)
-                else:
-                    result = json.dumps(_result, cls=DateTimeEncoder)
-
-                if ttl > 0:
-                    # do not use server-side cache, but keep ETag
-                    await cache.set(cache_key, result, ex=ttl)
-            except Exception as e:
-                logging.error(f"Failed to set redis key {cache_key}")
-                logging.exception(e)
+        payload = await resolve_cached_payload(
+            request, cache_key, cache_endpoint_name(callable), compute, ttl
+        )
+        return compressed_response(request, payload, "application/json", etag)
 
-        return Response(
-            content=result, media_type="application/json", headers={"ETag": etag}
+    return resolve
+
+
+async def cached_tile_response(request: Request):
+    """Same as `cached_json_response`, for Mapbox Vector Tiles"""
+
+    async def resolve(
+        cache_suffix: str,
+        callable: Callable[[Any], Awaitable[bytes]],
+        ttl: int = 0,
+        *args: Any,
+        **kw: Any,
+    ):
+        cache_key = build_cache_key(callable, cache_suffix, args, kw)
+        etag = hashlib.sha1(cache_key.encode()).hexdigest()
+
+        if request.headers.get("if-none-match") == representation_etag(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED)
+
+        async def compute() -> bytes:
+            # empty tiles are valid and cached as well
+            return bytes(await callable(*args, **kw) or b"")
+
+        payload = await resolve_cached_payload(
+            request, cache_key, cache_endpoint_name(callable), compute, ttl
+        )
+        return compressed_response(
+            request, payload, "application/vnd.mapbox-vector-tile", etag
         )
 
     return resolve
+
+
+async def get_cache_metrics(cache: redis.Redis) -> Dict[str, Dict[str, int]]:
+    """Counters of cached endpoints, by endpoint name"""
+    metrics: Dict[str, Dict[str, int]] = {}
+    async for key in cache.scan_iter(match=f"{CACHE_METRICS_PREFIX}*"):
+        key = key.decode() if isinstance(key, bytes) else key
+        values = await cache.hgetall(key)  # type: ignore
+        metrics[key[len(CACHE_METRICS_PREFIX) :]] = {
+            (k.decode() if isinstance(k, bytes) else k): int(v)
+            for k, v in values.items()
+        }
+    return metrics
@@ -24,5 +24,8 @@ class Settings(BaseSettings):  # type: ignore
     # https://redis-py.readthedocs.io/en/v4.6.0/connections.html#async-client
     REDIS_DSN: RedisDsn = Field("redis://redis:6379/1", alias="CELERY_RESULT_BACKEND")
 
+    # Largest compressed response payload kept in cache, in bytes
+    CACHE_MAX_PAYLOAD_SIZE: int = 64 * 1024 * 1024
+
 
 settings = Settings()  # type: ignore
@@ -0,0 +1,58 @@
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import h3
+
+# Connection requests are indexed by H3 cell of finest resolution as integer,
+# so that cell of any coarser resolution maps to a contiguous range of keys.
+# https://h3geo.org/docs/core-library/h3Indexing#bit-layout-of-h3index
+H3_KEY_RESOLUTION = 15
+
+_RES_OFFSET = 52
+_RES_MASK = 0xF << _RES_OFFSET
+_DIGIT_BITS = 3
+
+# Resolutions of density layer served to map, by zoom level
+DENSITY_MIN_RESOLUTION = 0
+DENSITY_MAX_RESOLUTION = 10
+
+
+def h3_key(lat: Optional[float], lon: Optional[float]) -> Optional[int]:
+    if lat is None or lon is None:
+        return None
+    return h3.string_to_h3(h3.geo_to_h3(lat, lon, H3_KEY_RESOLUTION))
+
+
+def h3_key_range(h3id: str) -> Tuple[int, int]:
+    """Inclusive range of `h3_key` of all cells within given H3 cell"""
+    res = h3.h3_get_resolution(h3id)
+    unused_bits = _DIGIT_BITS * (H3_KEY_RESOLUTION - res)
+
+    # digits below cell resolution are 7 (unused), first child is 0, last is 6
+    key = (h3.string_to_h3(h3id) & ~_RES_MASK) | (H3_KEY_RESOLUTION << _RES_OFFSET)
+    first = key & ~((1 << unused_bits) - 1)
+    last = first | sum(6 << (_DIGIT_BITS * i) for i in range(H3_KEY_RESOLUTION - res))
+
+    return first, last
+
+
+def h3_parent_key_mask(res: int) -> Tuple[int, int]:
+    """
+    Masks converting `h3_key` into integer H3 cell of given resolution,
+    `parent = (h3_key & keep) | set`, applicable in SQL on BIGINT.
+    """
+    unused = (1 << (_DIGIT_BITS * (H3_KEY_RESOLUTION - res))) - 1
+    keep = ~(_RES_MASK | unused)
+    return keep, (res << _RES_OFFSET) | unused
+
+
+def h3_resolution_for_zoom(zoom: float) -> int:
+    """H3 resolution with cells of readable size at web map zoom level"""
+    res = round(zoom * 2 / 3)
+    return max(DENSITY_MIN_RESOLUTION, min(DENSITY_MAX_RESOLUTION, res))
+
+
+@lru_cache(maxsize=2**16)
+def h3_cell_boundary(h3id: str) -> Tuple[Tuple[float, float], ...]:
+    """GeoJSON polygon ring of H3 cell, cells are immutable so cached"""
+    return tuple(tuple(x) for x in h3.h3_to_geo_boundary(h3id, geo_json=True))
@@ -3,7 +3,14 @@ import uuid
 from enum import Enum
 from typing import TYPE_CHECKING, Any, List, Optional
 
-from sqlalchemy import UUID, ForeignKey, String, UniqueConstraint
+from sqlalchemy import (
+    UUID,
+    BigInteger,
+    ForeignKey,
+    Index,
+    String,
+    UniqueConstraint,
+)
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
@@ -99,6 +106,8 @@ class ConnectionRequest(Base):
     __tablename__ = "connection_requests"
     __table_args__ = (
         UniqueConstraint("project_id", "bus_id", name="_connection_request_bus_id"),
+        # key of stable order and cursor pagination of listing
+        Index("ix_connection_requests_updated_at_id", "updated_at", "id"),
     )
 
     id: Mapped[UUID] = mapped_column(UUID, default=uuid.uuid4, primary_key=True)
@@ -115,6 +124,8 @@ class ConnectionRequest(Base):
     )
 
     h3_ix: Mapped[Optional[str]] = mapped_column(String(20), nullable=True, index=True)
+    # finest resolution H3 cell as integer, see `h3index` module
+    h3_key: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True, index=True)
 
     power_total: Mapped[float]
     power_increase: Mapped[float]
@@ -122,6 +122,40 @@ class ConnectionRequestApiSchema(ConnectionRequestUnified):
         return data
 
 
+class ConnectionRequestListItem(CamelModel):
+    """Connection request columns shown in listing tables"""
+
+    id: str
+    projectId: str
+    createdDateTime: datetime
+    dateDesired: datetime
+    updatedAt: datetime
+    powerTotal: float
+    powerIncrease: float
+    status: ConnectionStatusEnum
+    connectionKind: ConnectionKindEnum
+    connectionEnergyKind: ConnectionEnergyKindEnum
+    connectivityNode: ConnectivityNode
+    organization: Optional[Organization] = None
+
+    @classmethod
+    def from_sa(cls, x: ConnectionRequest):
+        return cls(
+            id=str(x.id),
+            projectId=x.project_id,
+            createdDateTime=x.created_at,
+            dateDesired=x.date_desired,
+            updatedAt=x.updated_at,
+            powerTotal=x.power_total,
+            powerIncrease=x.power_increase,
+            status=x.status,
+            connectionKind=x.connection_kind,
+            connectionEnergyKind=x.connection_energy_kind,
+            connectivityNode=ConnectivityNode(id=x.bus.number),
+            organization=Organization(name=x.org.name) if x.org else None,
+        )
+
+
 @dataclass
 class ConnectionFilterParams:
     bus_id: List[uuid.UUID]
@@ -1,34 +1,70 @@
+import datetime
 import json
 import uuid
-from typing import List
+from typing import Any, List, Optional, Tuple
 
 import h3
-from sqlalchemy import func, select
+from sqlalchemy import BigInteger, Select, func, literal, select, tuple_
+from sqlalchemy.orm import (
+    contains_eager,
+    joinedload,
+    load_only,
+    raiseload,
+    selectinload,
+)
 
 from ..database.dependencies import DatabaseSession
+from ..database.helpers import estimate_count
 from ..networks.models import Bus
 from ..networks.schemas import ConnectionRequestGeoFeature
 from ..schemas.geo import GeoFeature, PointsGeoJson, PolygonGeometry, PolygonsGeoJson
-from ..schemas.paginated import PaginatedResponse, PaginationQueryParams
+from ..schemas.paginated import (
+    CountModeEnum,
+    CursorPaginationQueryParams,
+    PaginatedResponse,
+    decode_cursor,
+    encode_cursor,
+)
 from . import models
+from .h3index import h3_cell_boundary, h3_key_range, h3_parent_key_mask
 from .schemas import (
     ConnectionFilterParams,
     ConnectionRequestApiSchema,
+    ConnectionRequestListItem,
     ConnectionRequestUnified,
 )
 
+# stable order of listing, also key of cursor pagination
+LISTING_ORDER = (models.ConnectionRequest.updated_at, models.ConnectionRequest.id)
+
 
 class ConnectionRequestService:
     def __init__(self, session: DatabaseSession):
         self.session = session
 
-    async def build_density_geojson(self, net_id: uuid.UUID) -> PolygonsGeoJson:
+    async def build_density_geojson(
+        self, net_id: uuid.UUID, res: Optional[int] = None
+    ) -> PolygonsGeoJson:
+        """
+        Connection requests aggregated into H3 cells of given resolution,
+        or resolution chosen for network on import if it is not set
+        """
         PolygonGeoFeature = GeoFeature[PolygonGeometry]
         features: List[PolygonGeoFeature] = []
 
+        cell: Any
+        if res is None:
+            cell = models.ConnectionRequest.h3_ix
+        else:
+            # parent cell of indexed key, computed with bit masks
+            keep, set_bits = h3_parent_key_mask(res)
+            cell = (
+                models.ConnectionRequest.h3_key.op("&")(literal(keep, BigInteger))
+            ).op("|")(literal(set_bits, BigInteger))
+
         stmt = (
             select(
-                models.ConnectionRequest.h3_ix,
+                cell,
                 func.count(),
                 func.sum(models.ConnectionRequest.power_increase),
             )
@@ -37,7 +73,7 @@ class ConnectionRequestService:
                     select(Bus.id).where(Bus.net_id == net_id)
                 )
             )
-            .group_by(models.ConnectionRequest.h3_ix)
+            .group_by(cell)
         )
         result = await self.session.execute(stmt)
 
@@ -45,9 +81,10 @@ class ConnectionRequestService:
             if not h or not pwr:
                 continue
 
-            geom = PolygonGeometry(
-                coordinates=(h3.h3_to_geo_boundary(h, geo_json=True),)
-            )
+            if not isinstance(h, str):
+                h = h3.h3_to_string(h)
+
+            geom = PolygonGeometry(coordinates=(list(h3_cell_boundary(h)),))
             props = {"id": h, "power_increase_total": pwr, "count": count}
 
             feat = PolygonGeoFeature(geometry=geom, properties=props)
@@ -92,9 +129,15 @@ class ConnectionRequestService:
 
         return PointsGeoJson(features=features)
 
-    async def paginate(
-        self, net_id: uuid.UUID, p: PaginationQueryParams, f: ConnectionFilterParams
-    ):
+    @staticmethod
+    def parse_cursor(cursor: str) -> Tuple[datetime.datetime, uuid.UUID]:
+        """Decode listing cursor, raises ValueError if it is malformed"""
+        values = decode_cursor(cursor)
+        if len(values) != 2:
+            raise ValueError("Malformed cursor")
+        return datetime.datetime.fromisoformat(values[0]), uuid.UUID(values[1])
+
+    def _filter(self, net_id: uuid.UUID, f: ConnectionFilterParams) -> Select:
         stmt = (
             select(models.ConnectionRequest)
             .join(models.Bus, models.ConnectionRequest.bus)
@@ -128,17 +171,86 @@ class ConnectionRequestService:
             stmt = stmt.filter(models.ConnectionRequest.bus_id.in_(f.bus_id))
 
         if f.h3id:
-            bounds = h3.h3_to_geo_boundary(f.h3id, geo_json=True)
-            points = ", ".join(["{0} {1}".format(*latlon) for latlon in bounds])
-            polygon = func.ST_GEOMFROMTEXT(f"SRID=4326;POLYGON(({points}))")
-            stmt = stmt.filter(func.ST_Contains(polygon, models.ConnectionRequest.geom))
+            stmt = stmt.filter(
+                models.ConnectionRequest.h3_key.between(*h3_key_range(f.h3id))
+            )
+
+        return stmt
 
-        count = await self.session.scalar(
-            select(func.count()).select_from(stmt.subquery())
+    async def _page(
+        self, stmt: Select, p: CursorPaginationQueryParams
+    ) -> Tuple[int, List[models.ConnectionRequest], Optional[str]]:
+        count: Optional[int]
+        if p.count == CountModeEnum.ESTIMATE:
+            count = await estimate_count(self.session, stmt)
+        else:
+            count = await self.session.scalar(
+                select(func.count()).select_from(stmt.subquery())
+            )
+
+        stmt = stmt.order_by(*LISTING_ORDER).limit(p.limit)
+        if p.cursor:
+            stmt = stmt.filter(tuple_(*LISTING_ORDER) > self.parse_cursor(p.cursor))
+        else:
+            stmt = stmt.offset(p.offset)
+
+        items = list((await self.session.scalars(stmt)).unique())
+
+        cursor = None
+        if items and len(items) == p.limit:
+            cursor = encode_cursor(items[-1].updated_at.isoformat(), items[-1].id)
+
+        return count or 0, items, cursor
+
+    async def paginate(
+        self,
+        net_id: uuid.UUID,
+        p: CursorPaginationQueryParams,
+        f: ConnectionFilterParams,
+    ):
+        # collection is loaded separately, so LIMIT is not applied to joined rows
+        stmt = self._filter(net_id, f).options(
+            contains_eager(models.ConnectionRequest.bus).noload(models.Bus.net),
+            selectinload(models.ConnectionRequest.milestone),
         )
-        results = await self.session.scalars(stmt.limit(p.limit).offset(p.offset))
+        count, items, cursor = await self._page(stmt, p)
 
         return PaginatedResponse[ConnectionRequestApiSchema](
-            count=count or 0,
-            items=[ConnectionRequestApiSchema.from_sa(x) for x in results.unique()],
+            count=count,
+            items=[ConnectionRequestApiSchema.from_sa(x) for x in items],
+            cursor=cursor,
+        )
+
+    async def paginate_slim(
+        self,
+        net_id: uuid.UUID,
+        p: CursorPaginationQueryParams,
+        f: ConnectionFilterParams,
+    ):
+        """Same as `paginate`, loads only columns shown in listing tables"""
+        R = models.ConnectionRequest
+        stmt = self._filter(net_id, f).options(
+            contains_eager(R.bus).load_only(models.Bus.number, raiseload=True),
+            joinedload(R.org).load_only(models.Organization.name, raiseload=True),
+            load_only(
+                R.id,
+                R.project_id,
+                R.created_at,
+                R.date_desired,
+                R.updated_at,
+                R.power_total,
+                R.power_increase,
+                R.status,
+                R.connection_kind,
+                R.connection_energy_kind,
+                raiseload=True,
+            ),
+            raiseload("*"),
+        )
+        count, items, cursor = await self._page(stmt, p)
+
+        return PaginatedResponse[ConnectionRequestListItem](
+            count=count,
+            items=[ConnectionRequestListItem.from_sa(x) for x in items],
+            cursor=cursor,
         )
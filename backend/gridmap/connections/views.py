@@ -6,22 +6,25 @@ import h3
 from fastapi import APIRouter, Depends, Query, status
 from fastapi.exceptions import HTTPException
 from pydantic import constr
-from sqlalchemy import select
-from sqlalchemy.sql.expression import func
 
 from ..auth.dependencies import get_current_user
 from ..auth.schemas import AuthzScopes, OIDCIdentity
 from ..cache.dependencies import cached_json_response
-from ..networks.models import Bus
+from ..networks.dependencies import NetworkSubsystemsServiceAnnotated
+from ..networks.service import NetworkSubsystemsService
 from ..schemas.geo import PointsGeoJson, PolygonsGeoJson
-from ..schemas.paginated import PaginatedResponse, PaginationQueryParams
+from ..schemas.paginated import CursorPaginationQueryParams, PaginatedResponse
+from .h3index import h3_resolution_for_zoom
 from .models import (
     ConnectionEnergyKindEnum,
     ConnectionKindEnum,
-    ConnectionRequest,
     ConnectionStatusEnum,
 )
-from .schemas import ConnectionFilterParams, ConnectionRequestApiSchema
+from .schemas import (
+    ConnectionFilterParams,
+    ConnectionRequestApiSchema,
+    ConnectionRequestListItem,
+)
 from .service import ConnectionRequestService
 
 ConnectionRequestServiceAnnotated = Annotated[ConnectionRequestService, Depends()]
@@ -53,6 +56,40 @@ class ConnectionListQuery(ConnectionFilterParams):
 router = APIRouter(prefix="/nets/{net_id}/connections", tags=["connections"])
 
 
+async def cached_connection_requests_page(
+    service: ConnectionRequestService,
+    net_service: NetworkSubsystemsService,
+    cached,
+    paginate,
+    net_id: uuid.UUID,
+    pagination: CursorPaginationQueryParams,
+    filters: ConnectionListQuery,
+):
+    if filters.h3id and not h3.h3_is_valid(filters.h3id):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Invalid H3 index in 'h3id' param",
+        )
+
+    if pagination.cursor:
+        try:
+            service.parse_cursor(pagination.cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Invalid 'cursor' param",
+            )
+
+    return await cached(
+        await net_service.connections_cache_suffix(net_id),
+        paginate,
+        net_id=net_id,
+        ttl=900,
+        p=pagination,
+        f=filters,
+    )
+
+
 @router.get("/", response_model=PaginatedResponse[ConnectionRequestApiSchema])
 async def get_connection_requests(
     usr: Annotated[
@@ -64,32 +101,37 @@ async def get_connection_requests(
         ),
     ],
     service: ConnectionRequestServiceAnnotated,
+    net_service: NetworkSubsystemsServiceAnnotated,
     net_id: uuid.UUID,
-    pagination: PaginationQueryParams = Depends(),
+    pagination: CursorPaginationQueryParams = Depends(),
     filters: ConnectionListQuery = Depends(),
     cached=Depends(cached_json_response),
 ):
-    if filters.h3id and not h3.h3_is_valid(filters.h3id):
-        raise HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail="Invalid H3 index in 'h3id' param",
-        )
+    return await cached_connection_requests_page(
+        service, net_service, cached, service.paginate, net_id, pagination, filters
+    )
 
-    (updated_at,) = (
-        await service.session.execute(
-            select(func.max(ConnectionRequest.updated_at))
-            .join(Bus, ConnectionRequest.bus)
-            .filter(Bus.net_id == net_id)
-        )
-    ).one()
 
-    return await cached(
-        updated_at.timestamp() if updated_at else None,
-        service.paginate,
-        net_id=net_id,
-        ttl=900,
-        p=pagination,
-        f=filters,
+@router.get("/list", response_model=PaginatedResponse[ConnectionRequestListItem])
+async def get_connection_requests_list(
+    usr: Annotated[
+        OIDCIdentity,
+        Depends(
+            get_current_user(
+                required_permissions=[AuthzScopes.NET_READ_BY_ID, AuthzScopes.NET_ADMIN]
+            )
+        ),
+    ],
+    service: ConnectionRequestServiceAnnotated,
+    net_service: NetworkSubsystemsServiceAnnotated,
+    net_id: uuid.UUID,
+    pagination: CursorPaginationQueryParams = Depends(),
+    filters: ConnectionListQuery = Depends(),
+    cached=Depends(cached_json_response),
+):
+    """Same as connection requests listing, with only columns shown in tables"""
+    return await cached_connection_requests_page(
+        service, net_service, cached, service.paginate_slim, net_id, pagination, filters
     )
 
 
@@ -105,21 +147,21 @@ async def get_connection_requests_density_geojson(
     ],
     net_id: uuid.UUID,
     service: ConnectionRequestServiceAnnotated,
+    net_service: NetworkSubsystemsServiceAnnotated,
     cached=Depends(cached_json_response),
+    zoom: Optional[float] = Query(
+        None,
+        ge=0,
+        le=24,
+        description="Map zoom level, picks H3 resolution of density cells",
+    ),
 ):
-    (updated_at,) = (
-        await service.session.execute(
-            select(func.max(ConnectionRequest.updated_at))
-            .join(Bus, ConnectionRequest.bus)
-            .filter(Bus.net_id == net_id)
-        )
-    ).one()
-
     return await cached(
-        updated_at.timestamp() if updated_at else None,
+        await net_service.connections_cache_suffix(net_id),
         service.build_density_geojson,
         ttl=900,
         net_id=net_id,
+        res=h3_resolution_for_zoom(zoom) if zoom is not None else None,
     )
 
 
@@ -135,18 +177,11 @@ async def get_connection_requests_geojson(
     ],
     net_id: uuid.UUID,
     service: ConnectionRequestServiceAnnotated,
+    net_service: NetworkSubsystemsServiceAnnotated,
     cached=Depends(cached_json_response),
 ):
-    (updated_at,) = (
-        await service.session.execute(
-            select(func.max(ConnectionRequest.updated_at))
-            .join(Bus, ConnectionRequest.bus)
-            .filter(Bus.net_id == net_id)
-        )
-    ).one()
-
     return await cached(
-        updated_at.timestamp() if updated_at else None,
+        await net_service.connections_cache_suffix(net_id),
         service.point_geojson,
         ttl=900,
         net_id=net_id,
@@ -1,6 +1,34 @@
-from sqlalchemy import select
+import json
+import uuid
+from typing import Any, Dict, List, Sequence, Tuple
+
+from sqlalchemy import (
+    JSON,
+    ClauseElement,
+    ColumnElement,
+    Executable,
+    Select,
+    String,
+    Text,
+    and_,
+    cast,
+    column,
+    delete,
+    func,
+    insert,
+    literal_column,
+    select,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+
+# asyncpg limits a single statement to 32767 bind parameters,
+# keep multi-row statements well below that
+BULK_CHUNK_SIZE = 1000
 
 
 async def get_or_create(session: AsyncSession, model, **kwargs):
@@ -12,3 +40,204 @@ async def get_or_create(session: AsyncSession, model, **kwargs):
         session.add(instance)
         await session.commit()
     return instance
+
+
+async def get_or_create_many(
+    session: AsyncSession,
+    model,
+    rows: List[Dict[str, Any]],
+    chunk_size: int = BULK_CHUNK_SIZE,
+) -> Dict[Tuple[Any, ...], Any]:
+    """
+    Batch `get_or_create` of rows with same keys, e.g. dimension entities.
+
+    Existing rows are matched with single SELECT per chunk (NULLs match NULLs),
+    missing ones are inserted in bulk. Returns ids keyed by tuple of row values.
+    Transaction is left open.
+    """
+    if not rows:
+        return {}
+
+    table = model.__table__
+    keys = list(rows[0].keys())
+    distinct = list(dict.fromkeys(tuple(r[k] for k in keys) for r in rows))
+
+    ids: Dict[Tuple[Any, ...], Any] = {}
+    for i in range(0, len(distinct), chunk_size):
+        v = values(*[column(k, table.c[k].type) for k in keys], name="v").data(
+            distinct[i : i + chunk_size]
+        )
+        result = await session.execute(
+            select(table.c.id, *[table.c[k] for k in keys]).join(
+                v, and_(*[table.c[k].is_not_distinct_from(v.c[k]) for k in keys])
+            )
+        )
+        for id, *row in result.all():
+            ids.setdefault(tuple(row), id)
+
+    missing = [
+        {"id": uuid.uuid4(), **dict(zip(keys, x))} for x in distinct if x not in ids
+    ]
+    await bulk_insert(session, model, missing, chunk_size)
+    ids.update({tuple(r[k] for k in keys): r["id"] for r in missing})
+
+    return ids
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) of statement"""
+
+    inherit_cache = False
+
+    def __init__(self, stmt: Select):
+        self.statement = stmt
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element: Explain, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+async def estimate_count(session: AsyncSession, stmt: Select) -> int:
+    """Number of rows expected by query planner, cheap but approximate"""
+    plan = await session.scalar(Explain(stmt))
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def bulk_insert(
+    session: AsyncSession,
+    model,
+    rows: List[Dict[str, Any]],
+    chunk_size: int = BULK_CHUNK_SIZE,
+) -> int:
+    """Insert rows as multi-row INSERT statements, bypassing ORM unit of work.
+
+    Rows are plain dicts keyed by model attribute names. Transaction is left open.
+    """
+    for i in range(0, len(rows), chunk_size):
+        await session.execute(insert(model), rows[i : i + chunk_size])
+    return len(rows)
+
+
+async def bulk_update_geometry(
+    session: AsyncSession,
+    model,
+    geometries: Dict[Any, Dict[str, Any]],
+    chunk_size: int = BULK_CHUNK_SIZE,
+) -> int:
+    """Set GeoJSON geometries of model rows by id via UPDATE ... FROM (VALUES ...)"""
+    table = model.__table__
+    srid = table.c.geom.type.srid
+    items = list(geometries.items())
+
+    for i in range(0, len(items), chunk_size):
+        v = values(column("id", UUID), column("geom", String), name="v").data(
+            [(k, json.dumps(g)) for k, g in items[i : i + chunk_size]]
+        )
+        await session.execute(
+            update(table)
+            .where(table.c.id == v.c.id)
+            .values(geom=func.ST_SetSRID(func.ST_GeomFromGeoJSON(v.c.geom), srid))
+        )
+    return len(items)
+
+
+async def sync_rows(
+    session: AsyncSession,
+    model,
+    rows: List[Dict[str, Any]],
+    key: Sequence[str],
+    scope: ColumnElement,
+    chunk_size: int = BULK_CHUNK_SIZE,
+) -> Dict[str, int]:
+    """
+    Make rows of model matching `scope` equal to `rows`, matched by `key` columns.
+
+    Matched rows keep their ids and are updated only if other values differ,
+    missing ones are inserted and the rest deleted. Transaction is left open.
+    """
+    table = model.__table__
+    value_keys = [k for k in rows[0] if k not in key] if rows else []
+
+    existing: Dict[Tuple[Any, ...], List[Tuple[Any, ...]]] = {}
+    result = await session.execute(
+        select(table.c.id, *[table.c[k] for k in (*key, *value_keys)]).where(scope)
+    )
+    for id, *cols in result.all():
+        existing.setdefault(tuple(cols[: len(key)]), []).append((id, *cols[len(key) :]))
+
+    inserted: List[Dict[str, Any]] = []
+    updated: List[Tuple[Any, ...]] = []
+    for row in rows:
+        matches = existing.get(tuple(row[k] for k in key))
+        if not matches:
+            inserted.append(row)
+            continue
+
+        id, *current = matches.pop()
+        new = tuple(row[k] for k in value_keys)
+        if tuple(current) != new:
+            updated.append((id, *new))
+
+    for i in range(0, len(updated), chunk_size):
+        v = values(
+            column("id", UUID),
+            *[column(k, table.c[k].type) for k in value_keys],
+            name="v",
+        ).data(updated[i : i + chunk_size])
+        await session.execute(
+            update(table)
+            .where(table.c.id == v.c.id)
+            .values({k: v.c[k] for k in value_keys})
+        )
+
+    deleted = [id for matches in existing.values() for (id, *_) in matches]
+    for i in range(0, len(deleted), chunk_size):
+        await session.execute(
+            delete(table).where(table.c.id.in_(deleted[i : i + chunk_size]))
+        )
+
+    await bulk_insert(session, model, inserted, chunk_size)
+
+    return {"inserted": len(inserted), "updated": len(updated), "deleted": len(deleted)}
+
+
+def json_object(**fields: Any) -> ColumnElement:
+    """json_build_object() of named SQL expressions"""
+    args: List[Any] = []
+    for k, v in fields.items():
+        # keys are rendered inline, asyncpg cannot infer type of bound parameter
+        args.extend([literal_column(f"'{k}'"), v])
+    return func.json_build_object(*args)
+
+
+def geojson_feature(geom, properties: ColumnElement) -> ColumnElement:
+    """GeoJSON Feature built by PostGIS"""
+    return json_object(
+        type=literal_column("'Feature'"),
+        geometry=cast(func.ST_AsGeoJSON(geom), JSON),
+        properties=properties,
+    )
+
+
+def geojson_feature_collection(*features: Select) -> Select:
+    """
+    Aggregate statements selecting single `feature` column into serialized
+    GeoJSON FeatureCollection, without hydrating rows on Python side
+    """
+    subq = (
+        features[0].union_all(*features[1:]) if len(features) > 1 else features[0]
+    ).subquery()
+    return select(
+        cast(
+            json_object(
+                type=literal_column("'FeatureCollection'"),
+                features=func.coalesce(
+                    func.json_agg(subq.c.feature), literal_column("'[]'::json")
+                ),
+            ),
+            Text,
+        )
+    )
@@ -43,17 +43,57 @@ async def sa_engine(*args, **kw):
             await _async_engine.dispose()
 
 
+# Celery worker processes keep single event loop and engine across tasks,
+# so that synchronous task code reuses pooled database connections.
+# Engine is created after fork, asyncpg connections are bound to event loop.
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+_worker_engine: Optional[AsyncEngine] = None
+_worker_session: Optional[async_sessionmaker[AsyncSession]] = None
+
+
+def init_worker_engine():
+    global _worker_loop, _worker_engine, _worker_session
+
+    _worker_loop = asyncio.new_event_loop()
+    _worker_engine = create_async_engine(
+        settings.DATABASE_URL, pool_size=2, max_overflow=5, pool_pre_ping=True
+    )
+    _worker_session = async_sessionmaker(_worker_engine, expire_on_commit=False)
+
+
+def dispose_worker_engine():
+    global _worker_loop, _worker_engine, _worker_session
+
+    if _worker_loop and _worker_engine:
+        _worker_loop.run_until_complete(_worker_engine.dispose())
+        _worker_loop.close()
+
+    _worker_loop, _worker_engine, _worker_session = None, None, None
+
+
 def async_to_sync_session(callable: Callable[[AsyncSession], Awaitable[Any]]):
+    if _worker_loop and _worker_session:
+        session_factory = _worker_session
+
+        async def run_pooled() -> Any:
+            async with session_factory() as session:
+                result = await callable(session)
+                await session.commit()
+            return result
+
+        return _worker_loop.run_until_complete(run_pooled())
+
     async_engine = create_async_engine(settings.DATABASE_URL)
     async_session = async_sessionmaker(async_engine, expire_on_commit=False)
 
-    async def async_main() -> None:
+    async def async_main() -> Any:
         async with async_session() as session:
-            await callable(session)
+            result = await callable(session)
             await session.commit()
 
         # for AsyncEngine created in function scope, close and
         # clean-up pooled connections
         await async_engine.dispose()
+        return result
 
-    asyncio.run(async_main())
+    return asyncio.run(async_main())
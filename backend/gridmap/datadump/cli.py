@@ -1,9 +1,12 @@
 import asyncio
 import logging
 import os
-from datetime import datetime
+import sys
+import time
+import uuid
 from functools import partial
 from pathlib import Path
+from typing import Any, Dict, List, Set, Tuple
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
@@ -18,11 +21,14 @@ from ..networks.schemas import (
     SubsystemGeoJson,
 )
 from ..networks.service import NetworkSubsystemsService
-from .helpers import mock_connection_coords
+from .helpers import file_sha1, mock_connection_coords
 from .schemas import ConnectionsUnifiedSchema
 from .service_imports import DataImportService
 from .xlsx_importer import ConnectionRequestsImporter
 
+# Networks imported at once, each within own session and transaction
+IMPORT_CONCURRENCY = int(os.environ.get("IMPORT_CONCURRENCY", 4))
+
 
 def load_metadata(dirpath: str):
     metadata_path = os.path.join(dirpath, "metadata.json")
@@ -36,12 +42,32 @@ def load_metadata(dirpath: str):
     return metadata, gridcapacity_config
 
 
-async def import_network_data(basedir: str, net_service: NetworkSubsystemsService):
+def source_hashes(basedir: str, metadata: NetworkMetadataImport) -> Dict[str, str]:
+    """Content hashes of source files of network parts imported separately"""
+    conns = metadata.connectionRequests
+    return {
+        "subsystems": file_sha1(os.path.join(basedir, metadata.dump.subsystems)),
+        "geodata": file_sha1(os.path.join(basedir, metadata.dump.geodata)),
+        # placement of connection requests depends on mock distance as well
+        "connections": file_sha1(
+            os.path.join(basedir, conns.xlsx), str(conns.fake_coords_distance)
+        ),
+    }
+
+
+async def import_network_data(
+    basedir: str, net_service: NetworkSubsystemsService, stats: Dict[str, Any]
+) -> Tuple[uuid.UUID, NetworkMetadataImport, Dict[str, str], Set[str]]:
+    """
+    Import network parts whose source files changed since last import,
+    returns source hashes and parts left to import
+    """
     metadata, cfg = load_metadata(basedir)
     subsystems_path = os.path.join(basedir, metadata.dump.subsystems)
     geodata_path = os.path.join(basedir, metadata.dump.geodata)
 
     cfg.case_name = os.path.join(os.path.basename(basedir), cfg.case_name)
+    hashes = source_hashes(basedir, metadata)
 
     existing_network = await net_service.session.scalar(
         select(Network).filter(
@@ -51,19 +77,12 @@ async def import_network_data(basedir: str, net_service: NetworkSubsystemsServic
 
     if existing_network:
         logging.info(f"Network with case_name '{cfg.case_name}' is already present")
-        mtime = datetime.fromtimestamp(
-            max(
-                os.path.getmtime(subsystems_path),
-                os.path.getmtime(geodata_path),
-            )
-        )
-        should_import_subsystems = (
-            existing_network.created_at
-            and mtime > existing_network.created_at
-            and metadata.overwrite_if_modified
-        )
-        if not should_import_subsystems:
+        known = existing_network.source_hashes or {}
+        changed = {k for k, h in hashes.items() if known.get(k) != h}
+
+        if not changed or not metadata.overwrite_if_modified:
             raise RuntimeWarning(f"network {existing_network.id} been imported already")
+        logging.info(f"network {existing_network.id} changed: {sorted(changed)}")
     else:
         n = SerializedNetwork(
             title=os.path.basename(basedir),
@@ -71,26 +90,43 @@ async def import_network_data(basedir: str, net_service: NetworkSubsystemsServic
             gridcapacity_cfg=cfg,
         )
         existing_network = await net_service.create_network(n)
+        changed = set(hashes)
+
+    net_id: uuid.UUID = existing_network.id  # type: ignore
+
+    if "subsystems" in changed:
+        with open(subsystems_path, "r") as fh:
+            ss = SerializedSubsystems.model_validate_json(fh.read())
 
-    with open(subsystems_path, "r") as fh:
-        ss = SerializedSubsystems.model_validate_json(fh.read())
-        await net_service.import_subsystems(existing_network.id, ss)  # type: ignore
+        # hash is committed along with imported subsystems
+        await net_service.update_source_hashes(net_id, subsystems=hashes["subsystems"])
+        stats.update(await net_service.import_subsystems(net_id, ss))
+        logging.info(f"subsystems {subsystems_path} import is complete")
 
-    logging.info(f"subsystems {subsystems_path} import is complete")
+        # added branches and trafos have no geometry yet
+        changed.add("geodata")
+        # requests of removed buses are gone, added buses may match more
+        if stats.get("buses_inserted") or stats.get("buses_deleted"):
+            changed.add("connections")
 
-    with open(geodata_path, "r") as fh:
-        geodata = SubsystemGeoJson.model_validate_json(fh.read())
-        await net_service.import_subsystem_geodata(existing_network.id, geodata)  # type: ignore
+    if "geodata" in changed:
+        with open(geodata_path, "r") as fh:
+            geodata = SubsystemGeoJson.model_validate_json(fh.read())
 
-    logging.info(f"geodata {geodata_path} import is complete.")
-    return existing_network.id, metadata
+        await net_service.update_source_hashes(net_id, geodata=hashes["geodata"])
+        stats.update(await net_service.import_subsystem_geodata(net_id, geodata))
+        logging.info(f"geodata {geodata_path} import is complete.")
+
+    changed -= {"subsystems", "geodata"}
+    return net_id, metadata, hashes, changed
 
 
 async def import_connection_requests(
     basedir: str,
-    net_id: str,
+    net_id: uuid.UUID,
     metadata: NetworkMetadataImport,
     datadump_service: DataImportService,
+    stats: Dict[str, Any],
 ):
     distance = metadata.connectionRequests.fake_coords_distance
     xlsx_path = os.path.join(basedir, metadata.connectionRequests.xlsx)
@@ -114,49 +150,92 @@ async def import_connection_requests(
     else:
         imp = ConnectionRequestsImporter()
 
-    serialized = imp.run(xlsx_path)
+    # parsing is CPU bound, other networks proceed with database meanwhile
+    serialized = await asyncio.to_thread(imp.run, xlsx_path)
 
     # transform data to pydantic model
     model = ConnectionsUnifiedSchema.model_validate(serialized)
 
     # replace connection requests & scenarios in database
-    await datadump_service.import_unified(net_id, model)  # type: ignore
+    state = await datadump_service.import_unified(net_id, model)  # type: ignore
+    stats["connection_requests"] = state.imported
+    stats["connection_requests_skipped"] = state.skipped
+    stats["scenarios"] = state.scenarios
 
     logging.info(f"Processing connection requests from {xlsx_path} is completed")
 
 
-async def process(data_path: str, sess: AsyncSession):
-    directories = [str(entry) for entry in Path(data_path).iterdir() if entry.is_dir()]
-
-    net_service = NetworkSubsystemsService(sess)
-    datadump_service = DataImportService(sess)
-
-    for p in directories:
+async def process_network(
+    basedir: str,
+    session_factory: async_sessionmaker[AsyncSession],
+    semaphore: asyncio.Semaphore,
+) -> Dict[str, Any]:
+    """Import network directory with own session, returns summary of import"""
+    stats: Dict[str, Any] = {"network": os.path.basename(basedir)}
+
+    async with semaphore, session_factory() as sess:
+        started = time.time()
         try:
-            net_id, metadata = await import_network_data(p, net_service)
-            await import_connection_requests(p, net_id, metadata, datadump_service)
+            net_service = NetworkSubsystemsService(sess)
+            net_id, metadata, hashes, changed = await import_network_data(
+                basedir, net_service, stats
+            )
+
+            if "connections" in changed:
+                await net_service.update_source_hashes(
+                    net_id, connections=hashes["connections"]
+                )
+                await import_connection_requests(
+                    basedir, net_id, metadata, DataImportService(sess), stats
+                )
+            stats["status"] = "imported"
         except FileNotFoundError:
-            continue
+            stats["status"] = "skipped"
         except RuntimeWarning as e:
             logging.warning(e)
-        except Exception as e:
-            logging.error(f"Failed to process network data from '{p}'")
+            stats["status"] = "unchanged"
+        except Exception:
+            logging.exception(f"Failed to process network data from '{basedir}'")
+            await sess.rollback()
+            stats["status"] = "failed"
+        stats["seconds"] = round(time.time() - started, 1)
+
+    return stats
+
+
+async def process(
+    data_path: str,
+    session_factory: async_sessionmaker[AsyncSession],
+    concurrency: int = IMPORT_CONCURRENCY,
+) -> List[Dict[str, Any]]:
+    directories = [str(entry) for entry in Path(data_path).iterdir() if entry.is_dir()]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    summary = await asyncio.gather(
+        *(process_network(p, session_factory, semaphore) for p in sorted(directories))
+    )
+
+    for stats in summary:
+        logging.info(", ".join(f"{k}={v}" for k, v in stats.items()))
+
+    return summary
 
 
 async def main():
     location = os.environ["NET_DATA_ROOT"]
 
+    engine = create_async_engine(
+        settings.DATABASE_URL, pool_size=IMPORT_CONCURRENCY, max_overflow=10
+    )
     try:
-        engine = create_async_engine(
-            settings.DATABASE_URL, pool_size=2, max_overflow=10
-        )
         async_session = async_sessionmaker(engine, expire_on_commit=False)
-        async with async_session() as sess:
-            await process(location, sess)
+        summary = await process(location, async_session)
     finally:
-        await sess.close()
         await engine.dispose()
 
+    if any(x["status"] == "failed" for x in summary):
+        sys.exit(1)
+
 
 if __name__ == "__main__":
     loop = asyncio.get_event_loop()
@@ -1,14 +1,13 @@
+import hashlib
 import logging
 import math
-import random
-from typing import Dict, List, Tuple, Union
+from typing import Any, Dict, List, Tuple, Union
 
-from sweref99 import projections
+import numpy as np
 
 from ..networks.models import Bus
 from ..schemas.geo import PointGeometry
-
-tm = projections.make_transverse_mercator("SWEREF_99_TM")
+from .projections import geodetic_to_grid
 
 logger = logging.getLogger(__name__)
 
@@ -19,78 +18,95 @@ THREE_PI = math.pi * 3
 TWO_PI = math.pi * 2
 
 
-def to_radians(val: Tuple[float, float]):
-    return val[0] * DEG_TO_RAD, val[1] * DEG_TO_RAD
-
-
-def to_degrees(val: Tuple[float, float]):
-    return val[0] / DEG_TO_RAD, val[1] / DEG_TO_RAD
+def file_sha1(path: str, *extra: str) -> str:
+    """Hex digest of file contents and extra strings"""
+    h = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    for x in extra:
+        h.update(x.encode())
+    return h.hexdigest()
 
 
-def point_at_distance(seed: Tuple[float, float], distance: int):
-    lon, lat = to_radians(seed)
-    sin_lat = math.sin(lat)
-    cos_lat = math.cos(lat)
+def points_at_distance(lon, lat, distance, rng: np.random.Generator):
+    """Points at distance (meters) from seed (lon, lat) points in random direction"""
+    lon, lat = np.radians(lon), np.radians(lat)
+    sin_lat = np.sin(lat)
+    cos_lat = np.cos(lat)
 
-    bearing = random.random() * TWO_PI
+    bearing = rng.random(len(lon)) * TWO_PI
     theta = distance / EARTH_RADIUS
-    sin_bearing = math.sin(bearing)
-    cos_bearing = math.cos(bearing)
-    sin_theta = math.sin(theta)
-    cos_theta = math.cos(theta)
-
-    res_lat = math.asin(sin_lat * cos_theta + cos_lat * sin_theta * cos_bearing)
-    res_lon = lon + math.atan2(
-        sin_bearing * sin_theta * cos_lat, cos_theta - sin_lat * math.sin(res_lat)
+    sin_bearing = np.sin(bearing)
+    cos_bearing = np.cos(bearing)
+    sin_theta = np.sin(theta)
+    cos_theta = np.cos(theta)
+
+    res_lat = np.arcsin(sin_lat * cos_theta + cos_lat * sin_theta * cos_bearing)
+    res_lon = lon + np.arctan2(
+        sin_bearing * sin_theta * cos_lat, cos_theta - sin_lat * np.sin(res_lat)
     )
     res_lon = ((res_lon + THREE_PI) % TWO_PI) - math.pi
 
-    return to_degrees((res_lon, res_lat))
+    return np.degrees(res_lon), np.degrees(res_lat)
 
 
-def point_in_circle(coord: Tuple[float, float], distance: int):
+def points_in_circle(lon, lat, distance: int, rng: np.random.Generator):
     """
-    Creates random point within given distance from seed coordinates
+    Creates random points within given distance from seed coordinates
 
-    :param tuple center: wsg84 coords of seed point (lon, lat)
-    :param int radius: max distance from seed point in meters
-    :return: wsg84 point coordinate (lon, lat)
+    :param array lon: wsg84 longitudes of seed points
+    :param array lat: wsg84 latitudes of seed points
+    :param int distance: max distance from seed point in meters
+    :return: wsg84 coordinates of points (lon, lat)
     :rtype: tuple
     """
-    rnd = random.random()
-    random_dist = round(math.pow(rnd, 0.5) * distance)
-    return point_at_distance(coord, random_dist)
+    random_dist = np.round(np.sqrt(rng.random(len(lon))) * distance)
+    return points_at_distance(lon, lat, random_dist, rng)
 
 
 def mock_connection_coords(
     buses: List[Bus],
     distance_meters,
-    coords: Dict[str, Union[int, float]],
-    conn_node_id: str,
+    coords: List[Dict[str, Union[int, float]]],
+    conn_node_ids: List[str],
     *args,
-):
-    n, e, rlat, rlon = None, None, None, None
-
-    bus = next((x for x in buses if x.number == conn_node_id), None)
-
-    i = 0
-    while not bus or not bus.geom and i < len(buses):
-        bus = random.choice(buses)
-        i += 1
-
-    if not bus.geom:
-        raise ValueError(f"Bus number '{conn_node_id}' has no geometry")
-
-    g = PointGeometry.parse_raw(bus.geom)  # type: ignore
-    lon, lat = g.coordinates
-
-    if type(lon) is float and type(lat) is float:
-        rlon, rlat = point_in_circle((lon, lat), distance_meters)
-        n, e = tm.geodetic_to_grid(lat, lon)
-
-    return {
-        "sweref99tmNorthing": n,
-        "sweref99tmEasting": e,
-        "wsg84lat": rlat,
-        "wsg84lon": rlon,
-    }
+) -> List[Dict[str, Any]]:
+    """
+    Random coordinates of connection requests around their buses,
+    requests with unknown bus or bus without geometry are placed by random bus.
+    """
+    bus_coords: Dict[str, Tuple[float, float]] = {}
+    for b in buses:
+        if b.geom:
+            g = PointGeometry.parse_raw(b.geom)  # type: ignore
+            lon, lat = g.coordinates
+            bus_coords[b.number] = (float(lon), float(lat))
+
+    if not bus_coords:
+        raise ValueError("No bus has geometry")
+
+    rng = np.random.default_rng()
+    numbers = list(bus_coords)
+    fallback = rng.integers(len(numbers), size=len(conn_node_ids))
+
+    seeds = np.array(
+        [
+            bus_coords.get(x) or bus_coords[numbers[i]]
+            for x, i in zip(conn_node_ids, fallback)
+        ],
+        dtype=float,
+    ).reshape(-1, 2)
+
+    rlon, rlat = points_in_circle(seeds[:, 0], seeds[:, 1], distance_meters, rng)
+    n, e = geodetic_to_grid(seeds[:, 1], seeds[:, 0])
+
+    return [
+        {
+            "sweref99tmNorthing": x[0],
+            "sweref99tmEasting": x[1],
+            "wsg84lat": x[2],
+            "wsg84lon": x[3],
+        }
+        for x in zip(n.tolist(), e.tolist(), rlat.tolist(), rlon.tolist())
+    ]
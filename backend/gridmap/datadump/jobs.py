@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Any, Optional
+
+import redis.asyncio as redis
+from celery import states
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.session import get_async_engine
+from .schemas import ImportJobStatus
+from .service_imports import DataImportService, UnifiedImport
+
+# Import jobs run in API process, their progress is kept in redis for a day
+IMPORT_JOB_PREFIX = "import-job__"
+IMPORT_JOB_TTL = 24 * 3600
+# running jobs report progress after every batch, silent ones died with process
+IMPORT_JOB_HEARTBEAT = 15 * 60
+
+
+async def set_import_job(cache: redis.Redis, job_id: uuid.UUID, **fields: Any):
+    key = f"{IMPORT_JOB_PREFIX}{job_id}"
+    mapping = {k: str(v) for k, v in fields.items() if v is not None}
+    mapping["job_id"] = str(job_id)
+    mapping["updated_at"] = str(int(time.time()))
+
+    async with cache.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping=mapping)  # type: ignore
+        pipe.expire(key, IMPORT_JOB_TTL)
+        await pipe.execute()
+
+
+async def get_import_job(
+    cache: redis.Redis, job_id: uuid.UUID
+) -> Optional[ImportJobStatus]:
+    job = await cache.hgetall(f"{IMPORT_JOB_PREFIX}{job_id}")  # type: ignore
+    if not job:
+        return None
+
+    status = ImportJobStatus.model_validate(job)
+    if status.state not in states.READY_STATES:
+        now = time.time()
+        if now - (status.started_at or now) > IMPORT_JOB_TTL:
+            status.state, status.error = states.FAILURE, "import job timed out"
+        elif now - (status.updated_at or now) > IMPORT_JOB_HEARTBEAT:
+            status.state, status.error = states.FAILURE, "import job stopped"
+    return status
+
+
+async def run_unified_stream_import(
+    cache: redis.Redis,
+    job_id: uuid.UUID,
+    net_id: uuid.UUID,
+    path: str,
+    max_bus_distance: Optional[int] = None,
+):
+    """Import spooled NDJSON file with own database session, then remove it"""
+
+    async def on_progress(state: UnifiedImport):
+        await set_import_job(
+            cache,
+            job_id,
+            lines=state.lines,
+            imported=state.imported,
+            skipped=state.skipped,
+        )
+
+    sess = AsyncSession(bind=await get_async_engine())
+    try:
+        await set_import_job(cache, job_id, state=states.STARTED)
+
+        with open(path, "rb") as fh:
+            state = await DataImportService(sess).import_unified_stream(
+                net_id, fh, max_bus_distance, on_progress=on_progress
+            )
+
+        await set_import_job(
+            cache,
+            job_id,
+            state=states.SUCCESS,
+            lines=state.lines,
+            imported=state.imported,
+            skipped=state.skipped,
+            scenarios=state.scenarios,
+        )
+    except Exception as e:
+        logging.exception(f"import job {job_id} in network {net_id} failed")
+        await sess.rollback()
+        await set_import_job(cache, job_id, state=states.FAILURE, error=str(e))
+    finally:
+        await sess.close()
+        await asyncio.to_thread(os.unlink, path)
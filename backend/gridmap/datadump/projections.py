@@ -0,0 +1,55 @@
+from typing import Tuple
+
+import numpy as np
+from sweref99 import projections
+
+# Transverse mercator of `sweref99` ported to arrays, formulas and constants
+# are those of `sweref99.transverse_mercator.TransverseMercator`
+# https://www.lantmateriet.se/globalassets/kartor-och-geografisk-information/gps-och-geodetisk-matning/gauss_conformal_projection.pdf
+tm = projections.make_transverse_mercator("SWEREF_99_TM")
+
+_DELTA = np.array([tm.δ1, tm.δ2, tm.δ3, tm.δ4])
+_BETA = np.array([tm.β1, tm.β2, tm.β3, tm.β4])
+_ABCD = np.array([tm.A, tm.B, tm.C, tm.D])
+_ABCD_STAR = np.array([tm.A_star, tm.B_star, tm.C_star, tm.D_star])
+
+# multiples 2, 4, 6, 8 of series terms, as column to broadcast over points
+_K = np.arange(2, 10, 2)[:, np.newaxis]
+
+
+def _series(x, coefs):
+    """Polynomial `c0 + c1 x^2 + c2 x^4 + c3 x^6` of `sin(x)`"""
+    s2 = np.sin(x) ** 2
+    return coefs[0] + s2 * (coefs[1] + s2 * (coefs[2] + s2 * coefs[3]))
+
+
+def grid_to_geodetic(northing, easting) -> Tuple[np.ndarray, np.ndarray]:
+    """SWEREF 99 TM grid coordinates to (latitude, longitude) in degrees"""
+    ξ = (np.asarray(northing, dtype=float) - tm.fn) / (tm.k0 * tm.â)
+    η = (np.asarray(easting, dtype=float) - tm.fe) / (tm.k0 * tm.â)
+
+    ξ_prim = ξ - (_DELTA[:, None] * np.sin(_K * ξ) * np.cosh(_K * η)).sum(axis=0)
+    η_prim = η - (_DELTA[:, None] * np.cos(_K * ξ) * np.sinh(_K * η)).sum(axis=0)
+
+    φ_star = np.arcsin(np.sin(ξ_prim) / np.cosh(η_prim))
+    δλ = np.arctan(np.sinh(η_prim) / np.cos(ξ_prim))
+
+    φ = φ_star + np.sin(φ_star) * np.cos(φ_star) * _series(φ_star, _ABCD_STAR)
+    return np.degrees(φ), np.degrees(tm.λ0 + δλ)
+
+
+def geodetic_to_grid(latitude, longitude) -> Tuple[np.ndarray, np.ndarray]:
+    """(latitude, longitude) in degrees to SWEREF 99 TM (northing, easting)"""
+    φ = np.radians(np.asarray(latitude, dtype=float))
+    λ = np.radians(np.asarray(longitude, dtype=float))
+
+    φ_star = φ - np.sin(φ) * np.cos(φ) * _series(φ, _ABCD)
+
+    δλ = λ - tm.λ0
+    ξ_prim = np.arctan(np.tan(φ_star) / np.cos(δλ))
+    η_prim = np.arctanh(np.cos(φ_star) * np.sin(δλ))
+
+    x = ξ_prim + (_BETA[:, None] * np.sin(_K * ξ_prim) * np.cosh(_K * η_prim)).sum(0)
+    y = η_prim + (_BETA[:, None] * np.cos(_K * ξ_prim) * np.sinh(_K * η_prim)).sum(0)
+
+    return tm.k0 * tm.â * x + tm.fn, tm.k0 * tm.â * y + tm.fe
@@ -1,6 +1,9 @@
+import uuid
 from datetime import datetime
 from typing import List, Optional
 
+from pydantic import BaseModel
+
 from ..connections.schemas import ConnectionRequestUnified
 from ..scenarios.schemas import ConnectionScenarioUnified
 from ..schemas import CamelModel
@@ -19,6 +22,13 @@ class ConnectionsUnifiedSchema(CamelModel):
     gridConnectionScenarioList: ConnectionScenarioUnifiedList
 
 
+class ConnectionsUnifiedStreamItem(CamelModel):
+    """Line of newline-delimited JSON import, holding single entity"""
+
+    gridConnectionRequest: Optional[ConnectionRequestUnified] = None
+    gridConnectionScenario: Optional[ConnectionScenarioUnified] = None
+
+
 class ConnectionRequestSplunk(ConnectionRequestUnified):
     time: Optional[datetime] = None
     source: Optional[str] = None
@@ -27,3 +37,16 @@ class ConnectionRequestSplunk(ConnectionRequestUnified):
 class ConnectionScenarioSplunk(ConnectionScenarioUnified):
     time: Optional[datetime] = None
     source: Optional[str] = None
+
+
+class ImportJobStatus(BaseModel):
+    job_id: uuid.UUID
+    net_id: uuid.UUID
+    state: str
+    lines: int = 0
+    imported: int = 0
+    skipped: int = 0
+    scenarios: int = 0
+    error: Optional[str] = None
+    started_at: Optional[int] = None
+    updated_at: Optional[int] = None
@@ -1,18 +1,29 @@
 import asyncio
-import json
 import logging
-import threading
 import time
 import uuid
-from functools import cache
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 import h3
 from celery import states
 from geoalchemy2 import functions as func
+from pydantic import ValidationError
 from sqlalchemy import delete, select, text
-from sqlalchemy.orm import load_only, raiseload
+from sqlalchemy.orm import load_only
 
+from ..connections.h3index import h3_key
 from ..connections.models import (
     AdminGeo,
     ConnectionRequest,
@@ -21,44 +32,27 @@ from ..connections.models import (
     Organization,
     User,
 )
+from ..connections.schemas import ConnectionRequestUnified
 from ..database.dependencies import DatabaseSession
-from ..database.helpers import get_or_create
+from ..database.helpers import bulk_insert, get_or_create_many
 from ..networks.models import Bus, Network
-from ..scenarios.models import ConnectionScenario
+from ..networks.service import NetworkSubsystemsService
+from ..scenarios.models import ConnectionScenario, scenario_requests_m2m
+from ..scenarios.schemas import ConnectionScenarioUnified
 from ..tasks.celeryapp import celery
-from .schemas import ConnectionsUnifiedSchema
+from .schemas import ConnectionsUnifiedSchema, ConnectionsUnifiedStreamItem
 
 # Desired number of connection request clusters in a network
 NET_CLUSTERS_NUM = 400
 
 
-class ThreadSafeCacheable:
-    def __init__(self, co):
-        self.co = co
-        self.done = False
-        self.result = None
-        self.lock = threading.Lock()
-
-    def __await__(self):
-        while True:
-            if self.done:
-                return self.result
-            if self.lock.acquire(blocking=False):
-                self.result = yield from self.co.__await__()
-                self.done = True
-                return self.result
-            else:
-                yield from asyncio.sleep(0.005)
-
-
-# Decorator enabling caching of coroutines
-# https://stackoverflow.com/a/46723144
-def cacheable(f):
-    def wrapped(*args, **kwargs):
-        r = f(*args, **kwargs)
-        return ThreadSafeCacheable(r)
+# Requests matched to buses by single statement, and closest buses by
+# planar distance to pick the closest by spherical distance from
+NEAREST_BUS_BATCH_SIZE = 5000
+NEAREST_BUS_CANDIDATES = 8
 
-    return wrapped
+# Connection requests validated and inserted at once by streaming import
+STREAM_IMPORT_BATCH_SIZE = 2000
 
 
 class DataImportService:
@@ -119,19 +113,58 @@ class DataImportService:
         res = next((res for (res, h_area) in h3areas if h_area <= cluster_area))
         return res
 
-    async def import_unified(
-        self,
-        net_id: uuid.UUID,
-        model: ConnectionsUnifiedSchema,
-        max_bus_distance: Optional[int] = None,
-    ):
-        start_time = time.time()
+    async def _nearest_buses(
+        self, net_id: uuid.UUID, points: List[Tuple[int, float, float]]
+    ) -> Dict[int, Tuple[uuid.UUID, float]]:
+        """
+        Closest bus (and distance in meters) of each (key, lon, lat) point.
+
+        Candidates are picked by KNN index scan in planar coordinates,
+        then ranked by spherical distance, batched with lateral join.
+        """
+        stmt = text(
+            """
+            SELECT p.key, c.id, c.distance
+            FROM unnest(
+                CAST(:keys AS integer[]),
+                CAST(:lons AS float8[]),
+                CAST(:lats AS float8[])
+            ) AS p(key, lon, lat)
+            CROSS JOIN LATERAL (
+                SELECT k.id, ST_DistanceSphere(k.geom, k.pt) AS distance
+                FROM (
+                    SELECT b.id, b.geom, ST_SetSRID(ST_MakePoint(p.lon, p.lat), 4326) AS pt
+                    FROM network_buses b
+                    WHERE b.net_id = :net_id AND b.geom IS NOT NULL
+                    ORDER BY b.geom <-> ST_SetSRID(ST_MakePoint(p.lon, p.lat), 4326)
+                    LIMIT :candidates
+                ) k
+                ORDER BY distance
+                LIMIT 1
+            ) c
+            """
+        )
+
+        nearest: Dict[int, Tuple[uuid.UUID, float]] = {}
+        for i in range(0, len(points), NEAREST_BUS_BATCH_SIZE):
+            keys, lons, lats = zip(*points[i : i + NEAREST_BUS_BATCH_SIZE])
+            result = await self.session.execute(
+                stmt,
+                {
+                    "keys": list(keys),
+                    "lons": list(lons),
+                    "lats": list(lats),
+                    "net_id": net_id,
+                    "candidates": NEAREST_BUS_CANDIDATES,
+                },
+            )
+            for key, bus_id, distance in result.all():
+                nearest[key] = (bus_id, distance)
 
-        @cache
-        @cacheable
-        async def get_or_create_cached(model, **kw):
-            return await get_or_create(self.session, model, **kw)
+        return nearest
 
+    async def begin_unified_import(self, net_id: uuid.UUID) -> "UnifiedImport":
+        """Purge existing connection requests and scenarios, transaction is left open"""
         net = (
             await self.session.execute(select(Network).where(Network.id == net_id))
         ).scalar_one()
@@ -145,74 +178,98 @@ class DataImportService:
         # Step 1. Remove exising connection requests and scenarios
         await self._purge_connections(net)
 
-        # Step 2. Insert new connection requests
         buses = list(
             await self.session.scalars(select(Bus).where(Bus.net_id == net.id))
         )
-        buses_coords = [
-            (
-                b,
-                json.loads(b.geom)["coordinates"][::-1],
+        return UnifiedImport(
+            net_id=net_id,
+            h3_res=h3_res,
+            buses_by_id={b.id: b for b in buses},
+            buses_by_number={b.number: b for b in buses},
+        )
+
+    async def import_requests_batch(
+        self,
+        state: "UnifiedImport",
+        requests: List[ConnectionRequestUnified],
+        max_bus_distance: Optional[int] = None,
+    ):
+        """Insert batch of connection requests, flushed and released from session"""
+        nearest: Dict[int, Tuple[uuid.UUID, float]] = {}
+        if max_bus_distance:
+            nearest = await self._nearest_buses(
+                state.net_id,
+                [
+                    (i, x.extra.wsg84lon, x.extra.wsg84lat)
+                    for i, x in enumerate(requests)
+                    if not x.connectivityNode.id
+                    and x.extra
+                    and x.extra.wsg84lon
+                    and x.extra.wsg84lat
+                ],
             )
-            for b in buses
-            if b.geom
-        ]
 
-        conn_count = 0
+        matched: List[Tuple[ConnectionRequestUnified, ConnectionRequest]] = []
 
-        for i, x in enumerate(model.gridConnectionRequestList.gridConnectionRequest):
+        for i, x in enumerate(requests):
             c = x.to_sa()
+            bus: Optional[Bus] = None
 
             if x.connectivityNode.id:
-                bus = next(
-                    (b for b in buses if b.number == x.connectivityNode.id), None
-                )
-                if bus:
-                    c.bus = bus
-
-            elif max_bus_distance and x.extra and x.extra.wsg84lon and x.extra.wsg84lat:
-                distances = [
-                    (
-                        b,
-                        h3.point_dist(
-                            latlon, (x.extra.wsg84lat, x.extra.wsg84lon), unit="m"
-                        ),
-                    )
-                    for (b, latlon) in buses_coords
-                ]
-                if distances:
-                    (bus, distance) = min(distances, key=lambda x: x[1])
+                bus = state.buses_by_number.get(x.connectivityNode.id)
 
-                    if distance >= 0 and distance <= max_bus_distance:
-                        c.bus = bus
-                    elif distance and bus:
-                        self.logger.warn(
-                            f"Closest bus {bus.name} is at {distance}m, max allowed is {max_bus_distance}m"
-                        )
+            elif max_bus_distance and i in nearest:
+                (bus_id, distance) = nearest[i]
+                closest = state.buses_by_id[bus_id]
+
+                if distance >= 0 and distance <= max_bus_distance:
+                    bus = closest
+                elif distance and closest:
+                    self.logger.warn(
+                        f"Closest bus {closest.name} is at {distance}m, max allowed is {max_bus_distance}m"
+                    )
 
-            if not c.bus:
+            if not bus:
                 self.logger.error(f"No bus matched for connection request '{x.id}'")
+                state.skipped += 1
                 continue
 
-            c.admin_geo = await get_or_create_cached(
-                AdminGeo, **x.adminGeo.model_dump()
-            )
-
-            c.internal_geo = await get_or_create_cached(
-                InternalGeo, level1_code=x.internalGeo.level1_code
-            )
-
-            c.account_manager = await get_or_create_cached(
-                User, full_name=x.accountManager.fullName
-            )
+            # buses are not kept attached to session across batches
+            c.bus_id = bus.id
+            matched.append((x, c))
 
-            c.grid_analyst = await get_or_create_cached(
-                User, full_name=x.gridAnalyst.fullName
-            )
+        # resolve shared dimension entities in bulk, one pass per table
+        admin_geo_ids = await get_or_create_many(
+            self.session, AdminGeo, [x.adminGeo.model_dump() for x, _ in matched]
+        )
+        internal_geo_ids = await get_or_create_many(
+            self.session,
+            InternalGeo,
+            [{"level1_code": x.internalGeo.level1_code} for x, _ in matched],
+        )
+        user_ids = await get_or_create_many(
+            self.session,
+            User,
+            [
+                {"full_name": name}
+                for name in [
+                    *(x.accountManager.fullName for x, _ in matched),
+                    *(x.gridAnalyst.fullName for x, _ in matched),
+                ]
+            ],
+        )
+        org_ids = await get_or_create_many(
+            self.session,
+            Organization,
+            [x.organization.model_dump() for x, _ in matched],
+        )
 
-            c.org = await get_or_create_cached(
-                Organization, **x.organization.model_dump()
-            )
+        for x, c in matched:
+            c.admin_geo_id = admin_geo_ids[tuple(x.adminGeo.model_dump().values())]
+            c.internal_geo_id = internal_geo_ids[(x.internalGeo.level1_code,)]
+            c.account_manager_id = user_ids[(x.accountManager.fullName,)]
+            c.grid_analyst_id = user_ids[(x.gridAnalyst.fullName,)]
+            c.org_id = org_ids[tuple(x.organization.model_dump().values())]
 
             c.milestone = [
                 Milestone(value=x.value, reason=x.reason, datetime=x.dateTime)
@@ -220,33 +277,40 @@ class DataImportService:
             ]
 
             if x.extra:
-                c.h3_ix = h3.geo_to_h3(x.extra.wsg84lat, x.extra.wsg84lon, h3_res)
+                c.h3_ix = h3.geo_to_h3(x.extra.wsg84lat, x.extra.wsg84lon, state.h3_res)
+                c.h3_key = h3_key(x.extra.wsg84lat, x.extra.wsg84lon)
 
             self.session.add(c)
-            conn_count += 1
 
         await self.session.flush()
 
-        failed_conn_count = (
-            len(model.gridConnectionRequestList.gridConnectionRequest) - conn_count
-        )
-        self.logger.info(
-            f"Imported {conn_count} connection requests in {time.time() - start_time}s. Skipped {failed_conn_count}"
-        )
+        # scenarios refer to connection requests of this network by project id
+        for _, c in matched:
+            state.request_ids_by_project.setdefault(c.project_id, []).append(c.id)
+
+        self.session.expunge_all()
+        state.imported += len(matched)
 
-        # Step 3. Insert new connection scenarios
-        scenario_count = 0
+    async def finish_unified_import(
+        self, state: "UnifiedImport", scenarios: List[ConnectionScenarioUnified]
+    ):
+        """Insert connection scenarios and commit transaction"""
         start_time = time.time()
 
-        for i, sc in enumerate(model.gridConnectionScenarioList.gridConnectionScenario):
-            ids = [v.refId for v in sc.connectionRequestsList]
+        user_ids = await get_or_create_many(
+            self.session,
+            User,
+            [{"full_name": sc.author.fullName} for sc in scenarios if sc.author],
+        )
 
-            scenario_connections = await self.session.execute(
-                select(ConnectionRequest)
-                .options(raiseload("*"))
-                .options(load_only(ConnectionRequest.id))
-                .where(ConnectionRequest.project_id.in_(ids))
-            )
+        scenario_requests: List[Tuple[ConnectionScenario, Set[Any]]] = []
+
+        for sc in scenarios:
+            request_ids = {
+                id
+                for v in sc.connectionRequestsList
+                for id in state.request_ids_by_project.get(v.refId, [])
+            }
 
             s = ConnectionScenario()
             s.code = sc.code
@@ -254,21 +318,132 @@ class DataImportService:
             s.priority = sc.priority
             s.created_at = sc.createdDateTime
             s.state = sc.state
-            s.connection_requests = scenario_connections.scalars().unique().all()  # type: ignore
-            s.net_id = net.id
+            s.net_id = state.net_id  # type: ignore
 
             if sc.author:
-                s.author = await get_or_create_cached(
-                    User, full_name=sc.author.fullName
-                )
+                s.author_id = user_ids[(sc.author.fullName,)]
 
             self.session.add(s)
-            scenario_count += 1
+            scenario_requests.append((s, request_ids))
 
-        # Step 4. Commit transaction and cleanup
+        # scenario ids are assigned on flush
+        await self.session.flush()
+        await bulk_insert(
+            self.session,
+            scenario_requests_m2m,
+            [
+                {"scenario_id": s.id, "connection_request_id": id}
+                for (s, request_ids) in scenario_requests
+                for id in request_ids
+            ],
+        )
+
+        await NetworkSubsystemsService(self.session).bump_connections_version(
+            state.net_id
+        )
         await self.session.commit()
 
-        get_or_create_cached.cache_clear()
         self.logger.info(
-            f"Imported {scenario_count} scenarios in {time.time() - start_time}s"
+            f"Imported {len(scenarios)} scenarios in {time.time() - start_time}s"
+        )
+
+    async def import_unified(
+        self,
+        net_id: uuid.UUID,
+        model: ConnectionsUnifiedSchema,
+        max_bus_distance: Optional[int] = None,
+    ) -> "UnifiedImport":
+        start_time = time.time()
+        state = await self.begin_unified_import(net_id)
+
+        # Step 2. Insert new connection requests
+        await self.import_requests_batch(
+            state,
+            model.gridConnectionRequestList.gridConnectionRequest,
+            max_bus_distance,
+        )
+        self.logger.info(
+            f"Imported {state.imported} connection requests in {time.time() - start_time}s. Skipped {state.skipped}"
         )
+
+        # Step 3. Insert new connection scenarios and commit
+        scenarios = model.gridConnectionScenarioList.gridConnectionScenario
+        await self.finish_unified_import(state, scenarios)
+        state.scenarios = len(scenarios)
+        return state
+
+    async def import_unified_stream(
+        self,
+        net_id: uuid.UUID,
+        lines: Iterable[Union[str, bytes]],
+        max_bus_distance: Optional[int] = None,
+        batch_size: int = STREAM_IMPORT_BATCH_SIZE,
+        on_progress: Optional[Callable[["UnifiedImport"], Awaitable[Any]]] = None,
+    ) -> "UnifiedImport":
+        """
+        Import newline-delimited JSON, one `ConnectionsUnifiedStreamItem` per line.
+
+        Connection requests are validated and inserted in batches of bounded size,
+        scenarios are kept until all requests are inserted. Whole import is single
+        transaction, as is `import_unified`. Lines are read and validated in worker
+        thread, not to block event loop on file I/O and parsing.
+        """
+        start_time = time.time()
+        state = await self.begin_unified_import(net_id)
+
+        numbered = enumerate(lines, start=1)
+        scenarios: List[ConnectionScenarioUnified] = []
+
+        def read_batch() -> Tuple[int, List[ConnectionRequestUnified]]:
+            """Next `batch_size` requests and number of last line read"""
+            n = 0
+            requests: List[ConnectionRequestUnified] = []
+            for n, line in numbered:
+                if not line.strip():
+                    continue
+                try:
+                    item = ConnectionsUnifiedStreamItem.model_validate_json(line)
+                except ValidationError as e:
+                    raise ValueError(f"line {n}: {e}") from e
+
+                if item.gridConnectionRequest:
+                    requests.append(item.gridConnectionRequest)
+                if item.gridConnectionScenario:
+                    scenarios.append(item.gridConnectionScenario)
+
+                if len(requests) >= batch_size:
+                    break
+            return n, requests
+
+        while True:
+            n, requests = await asyncio.to_thread(read_batch)
+            if not n:
+                break
+
+            state.lines = n
+            await self.import_requests_batch(state, requests, max_bus_distance)
+            if on_progress:
+                await on_progress(state)
+
+        self.logger.info(
+            f"Imported {state.imported} connection requests in {time.time() - start_time}s. Skipped {state.skipped}"
+        )
+
+        await self.finish_unified_import(state, scenarios)
+        state.scenarios = len(scenarios)
+        return state
+
+
+@dataclass
+class UnifiedImport:
+    """State of connection requests import carried between batches"""
+
+    net_id: uuid.UUID
+    h3_res: int
+    buses_by_id: Dict[Any, Bus]
+    buses_by_number: Dict[Any, Bus]
+    request_ids_by_project: Dict[str, List[Any]] = field(default_factory=dict)
+    lines: int = 0
+    imported: int = 0
+    skipped: int = 0
+    scenarios: int = 0
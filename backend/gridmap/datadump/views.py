@@ -1,14 +1,31 @@
+import asyncio
+import os
+import tempfile
+import time
 import uuid
 from typing import Annotated, List, Union
 
-from fastapi import APIRouter, Depends, Query, Response, status
+from celery import states
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
 
 from ..auth.dependencies import get_current_user
 from ..auth.schemas import AuthzScopes, OIDCIdentity
+from ..cache.dependencies import get_redis
+from .jobs import get_import_job, run_unified_stream_import, set_import_job
 from .schemas import (
     ConnectionRequestSplunk,
     ConnectionScenarioSplunk,
     ConnectionsUnifiedSchema,
+    ImportJobStatus,
 )
 from .service_exports import DataExportService
 from .service_imports import DataImportService
@@ -96,3 +113,88 @@ async def import_connections_unified_json(
 ):
     await service.import_unified(net_id, payload, max_bus_distance)
     return Response(status_code=status.HTTP_201_CREATED)
+
+
+@router.put(
+    "/import/unified/stream",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=ImportJobStatus,
+    description=(
+        "Import connection requests & scenarios from newline-delimited json, "
+        "one object per line with either `gridConnectionRequest` "
+        "or `gridConnectionScenario` key. Replaces existing entities in database. "
+        "Runs in background, progress is reported by import job"
+    ),
+)
+async def import_connections_unified_stream(
+    usr: Annotated[
+        OIDCIdentity,
+        Depends(
+            get_current_user(
+                required_permissions=[
+                    AuthzScopes.NET_UPDATE_BY_ID,
+                    AuthzScopes.NET_ADMIN,
+                ]
+            )
+        ),
+    ],
+    request: Request,
+    background_tasks: BackgroundTasks,
+    net_id: uuid.UUID,
+    max_bus_distance: int = Query(
+        default=0,
+        ge=0,
+        le=100000,
+        description="Max distance from bus to connection request",
+    ),
+):
+    # body is spooled to disk, never held in memory as a whole
+    fh = tempfile.NamedTemporaryFile("wb", suffix=".ndjson", delete=False)
+    try:
+        with fh:
+            async for chunk in request.stream():
+                await asyncio.to_thread(fh.write, chunk)
+
+        cache = get_redis(request)
+        job_id = uuid.uuid4()
+        await set_import_job(
+            cache,
+            job_id,
+            net_id=net_id,
+            state=states.PENDING,
+            started_at=int(time.time()),
+        )
+        job = await get_import_job(cache, job_id)
+    except BaseException:
+        # e.g. client disconnected mid-upload, or redis is down
+        os.unlink(fh.name)
+        raise
+
+    # from now on spooled file is removed by the job
+    background_tasks.add_task(
+        run_unified_stream_import, cache, job_id, net_id, fh.name, max_bus_distance
+    )
+    return job
+
+
+@router.get("/import/jobs/{job_id}", response_model=ImportJobStatus)
+async def get_connections_import_job(
+    usr: Annotated[
+        OIDCIdentity,
+        Depends(
+            get_current_user(
+                required_permissions=[
+                    AuthzScopes.NET_UPDATE_BY_ID,
+                    AuthzScopes.NET_ADMIN,
+                ]
+            )
+        ),
+    ],
+    request: Request,
+    net_id: uuid.UUID,
+    job_id: uuid.UUID,
+):
+    job = await get_import_job(get_redis(request), job_id)
+    if not job or job.net_id != net_id:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Import job not found")
+    return job
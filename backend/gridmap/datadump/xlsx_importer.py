@@ -1,14 +1,20 @@
 import json
 import logging
 import os
-from collections import defaultdict
+import pickle
+import stat
+import threading
 from datetime import date, datetime
-from typing import Any, Callable, Dict, Optional
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import jsonschema
+import numpy as np
 import pandas as pd
 from numpy import isnan
-from sweref99 import projections
+
+from .helpers import file_sha1
+from .projections import geodetic_to_grid, grid_to_geodetic
 
 COUNTRY = os.environ.get("COUNTRY", "ISL")
 
@@ -19,33 +25,64 @@ jsonschema_path = os.path.join(MODEL_DIR, "GridConnectionRequest.schema.json")
 
 admin_geo_lookup_csv = os.path.join(DATA_DIR, "shape", COUNTRY, COUNTRY + "_adm2.csv")
 
-tm = projections.make_transverse_mercator("SWEREF_99_TM")
+COORD_KEYS = ["sweref99tmNorthing", "sweref99tmEasting", "wsg84lat", "wsg84lon"]
+
+DEFINITIONS_REF = "#/definitions/"
+
+# Spreadsheet engine of pandas, e.g. "calamine", and directory of parsed sheets cache
+XLSX_ENGINE = os.environ.get("XLSX_ENGINE") or None
+# cache holds pickles, so it is disabled unless private directory is set explicitly
+XLSX_CACHE_DIR = os.environ.get("XLSX_CACHE_DIR") or None
+
+WORKBOOK_SHEETS: Dict[str, Dict[str, Any]] = {
+    "requests": {"sheet_name": 0, "header": 2, "parse_dates": True},
+    "scenarios": {"sheet_name": "Scenarios", "header": 0, "parse_dates": True},
+}
+
+# adminGeo attributes by columns of admin geo lookup table
+ADMIN_GEO_COLUMNS = {
+    "OBJECTID": "code",
+    "ISO": "level0_code",
+    "NAME_0": "level0_name",
+    "ID_1": "level1_code",
+    "NAME_1": "level1_name",
+    "ID_2": "level2_code",
+    "NAME_2": "level2_name",
+}
 
 logger = logging.getLogger(__name__)
 
 
-def _normalize_coords(coords: Dict[str, float], *args, **kw):
-    n, e, rlat, rlon = (
-        coords.get("sweref99tmNorthing", None),
-        coords.get("sweref99tmEasting", None),
-        coords.get("wsg84lat", None),
-        coords.get("wsg84lon", None),
-    )
+def _normalize_coords(
+    coords: List[Dict[str, Any]], *args, **kw
+) -> List[Dict[str, Any]]:
+    """
+    Both SWEREF 99 TM and WGS84 coordinates of connection requests, computed
+    from WGS84 ones if present, else from SWEREF 99 TM ones.
+    """
+    df = pd.DataFrame.from_records(coords, columns=COORD_KEYS)
+    df = df.apply(pd.to_numeric, errors="coerce").fillna(0)
+    n, e, lat, lon = (df[k].to_numpy(dtype=float) for k in COORD_KEYS)
 
-    if rlon and rlat:
-        n, e = tm.geodetic_to_grid(rlat, rlon)
-    elif n and e:
-        rlat, rlon = tm.grid_to_geodetic(int(n), int(e))
-    else:
-        logger.error(f"cannot detect coordinates from ({coords})")
-        n, e, rlat, rlon = 0, 0, 0, 0
+    # missing and zero values are not coordinates
+    geodetic = (lat != 0) & (lon != 0)
+    grid = ~geodetic & (n != 0) & (e != 0)
 
-    return {
-        "sweref99tmNorthing": n,
-        "sweref99tmEasting": e,
-        "wsg84lat": rlat,
-        "wsg84lon": rlon,
-    }
+    result = [{k: x.get(k, "") for k in COORD_KEYS} for x in coords]
+
+    gn, ge = geodetic_to_grid(lat[geodetic], lon[geodetic])
+    for i, x, y in zip(np.flatnonzero(geodetic), gn.tolist(), ge.tolist()):
+        result[i]["sweref99tmNorthing"], result[i]["sweref99tmEasting"] = x, y
+
+    glat, glon = grid_to_geodetic(np.trunc(n[grid]), np.trunc(e[grid]))
+    for i, x, y in zip(np.flatnonzero(grid), glat.tolist(), glon.tolist()):
+        result[i]["wsg84lat"], result[i]["wsg84lon"] = x, y
+
+    for i in np.flatnonzero(~(geodetic | grid)):
+        logger.error(f"cannot detect coordinates from ({coords[i]})")
+        result[i] = dict.fromkeys(COORD_KEYS, 0)
+
+    return result
 
 
 def json_serializer(obj):
@@ -61,21 +98,166 @@ def load_json(path):
     return data
 
 
+def _inline_refs(node: Any, definitions: Dict[str, Any], seen=()) -> Any:
+    """Replace local `#/definitions/..` references by their (acyclic) targets"""
+    if isinstance(node, dict):
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref.startswith(DEFINITIONS_REF) and ref not in seen:
+            target = definitions[ref[len(DEFINITIONS_REF) :]]
+            return _inline_refs(target, definitions, (*seen, ref))
+        return {k: _inline_refs(v, definitions, seen) for k, v in node.items()}
+    if isinstance(node, list):
+        return [_inline_refs(v, definitions, seen) for v in node]
+    return node
+
+
+@lru_cache(maxsize=4)
+def load_validator(path: str):
+    """
+    Validator of json schema, checked and compiled once per process.
+    References are inlined, resolving them per validated object is expensive.
+    """
+    schema = load_json(path)
+    cls = jsonschema.validators.validator_for(schema)
+    cls.check_schema(schema)
+
+    schema = {**schema, **_inline_refs(schema, schema.get("definitions", {}))}
+    return cls(schema)
+
+
+def admin_geo_l2_name_merge(level2_names: pd.Series, admin_geo: pd.DataFrame):
+    """adminGeo objects of municipality names, looked up by first matching NAME_2"""
+    lookup = admin_geo.dropna(subset=["NAME_2"]).drop_duplicates("NAME_2")
+    lookup = pd.DataFrame(
+        {
+            "level2_name": lookup["NAME_2"],
+            "found": lookup.rename(columns=ADMIN_GEO_COLUMNS)[
+                list(ADMIN_GEO_COLUMNS.values())
+            ].to_dict("records"),
+        }
+    )
+
+    merged = pd.DataFrame(
+        {"level2_name": level2_names.astype(object).to_numpy()}
+    ).merge(lookup, how="left", on="level2_name", sort=False)
+
+    return [
+        {"level2_name": name, **found}
+        if isinstance(found, dict)
+        else {"level2_name": name}
+        for name, found in zip(level2_names, merged["found"])
+    ]
+
+
+class SpreadsheetReader:
+    """
+    Reads several sheets of a workbook opened once.
+
+    Engine is any supported by `pandas.ExcelFile` (e.g. "calamine" with
+    python-calamine installed), default one is used if not set. Parsed sheets
+    are pickled in cache directory keyed by hash of workbook and engine, so that
+    unchanged spreadsheets are not parsed again. Pickles are loaded only from
+    directory owned by current user and not writable by others.
+    """
+
+    def __init__(
+        self,
+        engine: Optional[str] = XLSX_ENGINE,
+        cache_dir: Optional[str] = XLSX_CACHE_DIR,
+    ):
+        self.engine = engine or None
+        self.cache_dir = cache_dir or None
+
+    def cache_path(self, path: str, sheets: Dict[str, Dict[str, Any]]) -> str:
+        digest = file_sha1(
+            path, repr((sorted(sheets.items()), self.engine, pd.__version__))
+        )
+
+        assert self.cache_dir
+        return os.path.join(self.cache_dir, f"{digest}.pickle")
+
+    def cache_dir_trusted(self) -> bool:
+        """Create cache directory private to current user, or verify existing one"""
+        assert self.cache_dir
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            st = os.stat(self.cache_dir)
+        except OSError:
+            logger.warning(f"Cannot create cache dir {self.cache_dir}", exc_info=True)
+            return False
+
+        if st.st_uid != os.getuid() or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            logger.warning(
+                f"Cache dir {self.cache_dir} is not private to current user, "
+                "parsed sheets are not cached"
+            )
+            return False
+        return True
+
+    def read(
+        self, path: str, sheets: Dict[str, Dict[str, Any]]
+    ) -> Dict[str, pd.DataFrame]:
+        """DataFrames by key of `sheets`, which are `ExcelFile.parse` arguments"""
+        cache_path = (
+            self.cache_path(path, sheets)
+            if self.cache_dir and self.cache_dir_trusted()
+            else None
+        )
+
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, "rb") as fh:
+                    if os.fstat(fh.fileno()).st_uid != os.getuid():
+                        raise PermissionError(f"{cache_path} is not owned by user")
+                    return pickle.load(fh)
+            except Exception:
+                logger.warning(f"Cannot load cached sheets of {path}", exc_info=True)
+
+        with pd.ExcelFile(path, engine=self.engine) as xlsx:
+            result = {k: xlsx.parse(**kw) for k, kw in sheets.items()}
+
+        if cache_path:
+            try:
+                tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}"
+                with open(tmp_path, "wb") as fh:
+                    pickle.dump(result, fh, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, cache_path)
+            except OSError:
+                logger.warning(f"Cannot cache sheets of {path}", exc_info=True)
+
+        return result
+
+
 class ConnectionRequestsImporter:
     normalize_coords: Callable
 
-    def __init__(self, normalize_coords: Optional[Callable] = None) -> None:
+    def __init__(
+        self,
+        normalize_coords: Optional[Callable] = None,
+        reader: Optional[SpreadsheetReader] = None,
+    ) -> None:
         if callable(normalize_coords):
             self.normalize_coords = normalize_coords
         else:
             self.normalize_coords = _normalize_coords
 
+        self.reader = reader or SpreadsheetReader()
+        self._sheets: Optional[Tuple[str, Dict[str, pd.DataFrame]]] = None
+
+    def read_sheets(self, xlsx_input_path: str) -> Dict[str, pd.DataFrame]:
+        """Sheets of workbook, read at once and kept for the last workbook"""
+        if not self._sheets or self._sheets[0] != xlsx_input_path:
+            self._sheets = (
+                xlsx_input_path,
+                self.reader.read(xlsx_input_path, WORKBOOK_SHEETS),
+            )
+        # transforms modify frames in place
+        return {k: v.copy() for k, v in self._sheets[1].items()}
+
     def load_conn_req_sheet(self, xlsx_input_path: str):
         # Read XLSX file to dataframe
 
-        df: Any = pd.read_excel(
-            xlsx_input_path, sheet_name=0, header=2, parse_dates=True
-        )
+        df: Any = self.read_sheets(xlsx_input_path)["requests"]
 
         # DataFrame from Spreadsheet
         # df = sheet.to_pandas()
@@ -219,7 +401,7 @@ class ConnectionRequestsImporter:
 
         for k, v in maps.items():
             if k in df:
-                df[k] = df[k].map(lambda x: v.get(x, ""))
+                df[k] = df[k].map(v).fillna("")
 
         # Code and ID as sting
         for column in df:
@@ -239,27 +421,8 @@ class ConnectionRequestsImporter:
             admin_geo = pd.read_csv(admin_geo_lookup_csv)
             logger.info("%s admin_geo loaded." % admin_geo.size)
 
-            def admin_geo_l2_name_lookup(row, *args):
-                adminGeo = {}
-                adminGeo["level2_name"] = row["adminGeo_level2_name"]
-
-                if not adminGeo["level2_name"] is None:
-                    geoLookup = admin_geo.loc[
-                        admin_geo["NAME_2"] == adminGeo["level2_name"]
-                    ]
-                    if geoLookup.size > 0:
-                        adminGeo["code"] = geoLookup["OBJECTID"].values[0].item()
-                        adminGeo["level0_code"] = geoLookup["ISO"].values[0]
-                        adminGeo["level0_name"] = geoLookup["NAME_0"].values[0]
-                        adminGeo["level1_code"] = geoLookup["ID_1"].values[0].item()
-                        adminGeo["level1_name"] = geoLookup["NAME_1"].values[0]
-                        adminGeo["level2_code"] = geoLookup["ID_2"].values[0].item()
-                        adminGeo["level2_name"] = geoLookup["NAME_2"].values[0]
-
-                return adminGeo
-
-            df["adminGeo"] = df.apply(
-                admin_geo_l2_name_lookup, axis=1, result_type="reduce"
+            df["adminGeo"] = admin_geo_l2_name_merge(
+                df["adminGeo_level2_name"], admin_geo
             )
             df = df.drop(columns=["adminGeo_level2_name"])
 
@@ -302,18 +465,20 @@ class ConnectionRequestsImporter:
             "date_customerDeclined": "0_cancelled",
         }
 
-        def milestones(row, *args):
-            milestones = []
-            for in_key, out_key in map_dates.items():
-                val = getattr(row, in_key, None)
-                if not pd.isnull(val):
-                    milestones.append(
-                        {"value": in_key, "reason": out_key, "dateTime": val}
-                    )
-
-            return milestones
+        milestones: List[List[Dict[str, Any]]] = [[] for _ in range(len(df))]
+
+        # columns in order of milestones, rows without date skipped
+        for in_key, out_key in map_dates.items():
+            if in_key not in df:
+                continue
+            dates = df[in_key]
+            present = dates.notna().to_numpy()
+            for i, val in zip(np.flatnonzero(present), dates[present]):
+                milestones[i].append(
+                    {"value": in_key, "reason": out_key, "dateTime": val}
+                )
 
-        df["milestone"] = df.apply(milestones, axis=1, result_type="reduce")
+        df["milestone"] = milestones
 
         # Remove auxiliary Columns
         df_res = df
@@ -329,9 +494,7 @@ class ConnectionRequestsImporter:
     def load_scenario_sheet(self, xlsx_input_path: str):
         # Read XLSX file to dataframe
 
-        df = pd.read_excel(
-            xlsx_input_path, sheet_name="Scenarios", header=0, parse_dates=True
-        )
+        df = self.read_sheets(xlsx_input_path)["scenarios"]
 
         # Map excel columns to model
         # Rename excel headers, columns started from **excluded** removed
@@ -356,30 +519,16 @@ class ConnectionRequestsImporter:
 
         # author
 
-        def author_expand(row, *args):
-            obj = {}
-            obj["fullName"] = row["tmp_author"]
-            # jobTitle  can be added if need
-            return obj
-
-        df["author"] = df.apply(author_expand, axis=1, result_type="reduce")
-
-        df = df.drop(columns=["tmp_author"])
+        # jobTitle  can be added if need
+        df["author"] = [{"fullName": x} for x in df["tmp_author"]]
 
         # connection requests referencnes
+        df["connectionRequestsList"] = [
+            [{"refId": ref} for ref in refs]
+            for refs in df["tmp_request_list"].str.split(",")
+        ]
 
-        def con_req_ref_expand(row, *args):
-            obj = []
-            for ref in row["tmp_request_list"].split(","):
-                obj.append({"refId": ref})
-            # jobTitle  can be added if need
-            return obj
-
-        df["connectionRequestsList"] = df.apply(
-            con_req_ref_expand, axis=1, result_type="reduce"
-        )
-
-        df = df.drop(columns=["tmp_request_list"])
+        df = df.drop(columns=["tmp_author", "tmp_request_list"])
         return df
 
     def to_json(self, conn_req_df, scenarious_df):
@@ -400,18 +549,22 @@ class ConnectionRequestsImporter:
 
         for item in con_req_dict:
             remove_nans(item)
-            try:
-                conn_node_id = str(
-                    item.get("connectivityNode", {}).get("id", None) or 0
-                )
-                coords = defaultdict(str)
-                coords.update(item["extra"])
 
-                normalized = self.normalize_coords(coords, conn_node_id)
-                item["extra"].update(normalized)
+        # coordinates of all requests are normalized at once
+        with_extra = [x for x in con_req_dict if isinstance(x.get("extra"), dict)]
+        try:
+            normalized = self.normalize_coords(
+                [x["extra"] for x in with_extra],
+                [
+                    str(x.get("connectivityNode", {}).get("id", None) or 0)
+                    for x in with_extra
+                ],
+            )
+            for item, coords in zip(with_extra, normalized):
+                item["extra"].update(coords)
 
-            except Exception as e:
-                logger.exception(f"Failed to normalize coordinates: {e}")
+        except Exception as e:
+            logger.exception(f"Failed to normalize coordinates: {e}")
 
         result_obj = {}
         result_obj["gridConnectionRequestList"] = {
@@ -424,17 +577,16 @@ class ConnectionRequestsImporter:
 
         json_str = json.dumps(
             obj=result_obj,
-            indent=4,
             default=json_serializer,
             allow_nan=False,
         )
         return json.loads(json_str)
 
     def validate_result(self, json_data: dict):
-        schema_file = load_json(jsonschema_path)
+        validator = load_validator(jsonschema_path)
 
         try:
-            jsonschema.validate(instance=json_data, schema=schema_file)
+            validator.validate(json_data)
             logger.info("Given JSON data is Valid")
 
         except jsonschema.exceptions.ValidationError as err:  # type: ignore
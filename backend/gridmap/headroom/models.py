@@ -26,7 +26,7 @@ class BusHeadroom(Base):
     )
 
     scenario_id: Mapped[UUID] = mapped_column(
-        ForeignKey(ConnectionScenario.id, ondelete="CASCADE")
+        ForeignKey(ConnectionScenario.id, ondelete="CASCADE"), index=True
     )
     scenario: Mapped[ConnectionScenario] = relationship(
         ConnectionScenario, back_populates="headroom", lazy="raise", cascade="all"
@@ -35,6 +35,9 @@ class BusHeadroom(Base):
     bus_id: Mapped[UUID] = mapped_column(ForeignKey(Bus.id, ondelete="CASCADE"))
     bus: Mapped[Bus] = relationship(Bus, lazy="joined", cascade="all")
 
+    # celery task which calculated headroom, allows to resume interrupted calculation
+    solver_task_id: Mapped[Optional[str]]
+
     actual_load_mva: Mapped[ARRAY] = mapped_column(
         ARRAY(Float, as_tuple=True, dimensions=None)
     )
@@ -1,117 +1,180 @@
 import logging
+import time
 import uuid
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from celery import states
 from sqlalchemy import delete, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import aliased, joinedload, load_only
+from sqlalchemy.orm import aliased
 
+from ..database.helpers import bulk_insert
 from ..networks.models import Branch, Bus, Trafo
 from ..scenarios.models import ConnectionScenario
 from .models import BusHeadroom
-from .schemas import BranchLF, ScenarioHeadroomSchema, TrafoLF
+from .schemas import (
+    BranchLF,
+    BusHeadroomSchema,
+    LimitingFactor,
+    ScenarioHeadroomSchema,
+    TrafoLF,
+)
+
+
+class SubsystemsIndex:
+    """In-memory lookup of network subsystem ids by bus numbers/names"""
+
+    def __init__(self) -> None:
+        self.buses: Dict[str, uuid.UUID] = {}
+        self.bus_numbers: List[str] = []
+        self.branches: Dict[Tuple[str, str, str], uuid.UUID] = {}
+        self.trafos: Dict[Tuple[str, str, str], uuid.UUID] = {}
+
+    @classmethod
+    async def load(cls, session: AsyncSession, net_id: uuid.UUID):
+        index = cls()
+
+        buses = (
+            await session.execute(
+                select(Bus.id, Bus.number, Bus.name).filter(Bus.net_id == net_id)
+            )
+        ).all()
+
+        index.bus_numbers = [number for _, number, _ in buses]
+
+        # bus numbers take precedence over names
+        for bus_id, number, _ in buses:
+            index.buses.setdefault(number, bus_id)
+        for bus_id, _, name in buses:
+            index.buses.setdefault(name, bus_id)
+
+        BusFrom = aliased(Bus)
+        BusTo = aliased(Bus)
+        branches = await session.execute(
+            select(
+                Branch.id,
+                Branch.branch_id,
+                BusFrom.number,
+                BusFrom.name,
+                BusTo.number,
+                BusTo.name,
+            )
+            .join(BusFrom, Branch.from_bus)
+            .join(BusTo, Branch.to_bus)
+            .where(BusFrom.net_id == net_id, BusTo.net_id == net_id)
+        )
+        index._add_lines(index.branches, branches)
+
+        BusFrom = aliased(Bus)
+        BusTo = aliased(Bus)
+        trafos = await session.execute(
+            select(
+                Trafo.id,
+                Trafo.trafo_id,
+                BusFrom.number,
+                BusFrom.name,
+                BusTo.number,
+                BusTo.name,
+            )
+            .join(BusFrom, Trafo.from_bus)
+            .join(BusTo, Trafo.to_bus)
+            .where(BusFrom.net_id == net_id, BusTo.net_id == net_id)
+        )
+        index._add_lines(index.trafos, trafos)
+
+        return index
+
+    @staticmethod
+    def _add_lines(target: Dict[Tuple[str, str, str], uuid.UUID], rows):
+        # subsystems can be referenced by either bus number or bus name
+        for row_id, ckt, from_number, from_name, to_number, to_name in rows:
+            for f in (from_number, from_name):
+                for t in (to_number, to_name):
+                    target.setdefault((f, t, ckt), row_id)
+
+    def _limiting_factor(self, prefix: str, lf: Optional[LimitingFactor]):
+        row: Dict[str, Any] = {
+            f"{prefix}_lf_v": None,
+            f"{prefix}_lf_branch_id": None,
+            f"{prefix}_lf_trafo_id": None,
+        }
+
+        if lf:
+            row[f"{prefix}_lf_v"] = lf.v
+
+            if isinstance(lf.ss, BranchLF):
+                row[f"{prefix}_lf_branch_id"] = self.branches.get(
+                    (lf.ss.from_number, lf.ss.to_number, lf.ss.branch_id)
+                )
+
+            if isinstance(lf.ss, TrafoLF):
+                row[f"{prefix}_lf_trafo_id"] = self.trafos.get(
+                    (lf.ss.from_number, lf.ss.to_number, lf.ss.trafo_id)
+                )
+
+        return row
+
+    def headroom_row(
+        self,
+        scenario_id: uuid.UUID,
+        hr: BusHeadroomSchema,
+        solver_task_id: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Map solver output to `BusHeadroom` insert values, if bus is known"""
+        bus_id = self.buses.get(hr.bus.number)
+        if not bus_id:
+            return None
+
+        return {
+            "scenario_id": scenario_id,
+            "bus_id": bus_id,
+            "actual_load_mva": hr.actual_load_mva,
+            "actual_gen_mva": hr.actual_gen_mva,
+            "load_avail_mva": hr.load_avail_mva,
+            "gen_avail_mva": hr.gen_avail_mva,
+            "solver_task_id": solver_task_id,
+            **self._limiting_factor("load", hr.load_lf),
+            **self._limiting_factor("gen", hr.gen_lf),
+        }
 
 
 class ScenarioHeadroomService:
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def update_scenario_headroom(
-        self, scenario_id: uuid.UUID, data: ScenarioHeadroomSchema
-    ):
-        scenario = await self.session.scalar(
-            select(ConnectionScenario)
-            .options(joinedload("*"))
-            .filter(ConnectionScenario.id == scenario_id)
+    async def _scenario_net_id(self, scenario_id: uuid.UUID) -> uuid.UUID:
+        net_id = await self.session.scalar(
+            select(ConnectionScenario.net_id).filter(
+                ConnectionScenario.id == scenario_id
+            )
         )
 
-        if not scenario:
+        if not net_id:
             raise RuntimeError("Connection scenario was not found")
 
-        buses, branches, trafos = await self._subsystems(net_id=scenario.net_id)  # type: ignore
+        return net_id
+
+    async def update_scenario_headroom(
+        self, scenario_id: uuid.UUID, data: ScenarioHeadroomSchema
+    ):
+        started = time.time()
+
+        net_id = await self._scenario_net_id(scenario_id)
+        index = await SubsystemsIndex.load(self.session, net_id)
 
         await self.session.execute(
-            delete(BusHeadroom).where(BusHeadroom.scenario_id == scenario.id)
+            delete(BusHeadroom).where(BusHeadroom.scenario_id == scenario_id)
         )
-        await self.session.flush()
 
+        rows = []
         for hr in data.headroom:
-            bus = next((b for b in buses if hr.bus.number in [b.number, b.name]), None)
-            if not bus:
+            row = index.headroom_row(scenario_id, hr)
+            if not row:
                 logging.error(f"Failed to link headroom to subsystems: {hr}")
                 continue
+            rows.append(row)
 
-            m = BusHeadroom()
-            m.scenario_id = scenario.id
-            m.bus_id = bus.id
-            m.actual_load_mva = hr.actual_load_mva  # type: ignore
-            m.actual_gen_mva = hr.actual_gen_mva  # type: ignore
-            m.load_avail_mva = hr.load_avail_mva  # type: ignore
-            m.gen_avail_mva = hr.gen_avail_mva  # type: ignore
-
-            if hr.load_lf:
-                m.load_lf_v = hr.load_lf.v
-
-                if isinstance(hr.load_lf.ss, BranchLF):
-                    m.load_lf_branch_id = next(
-                        (
-                            b.id
-                            for b in branches
-                            if hr.load_lf.ss.from_number
-                            in [b.from_bus.number, b.from_bus.name]
-                            and hr.load_lf.ss.to_number
-                            in [b.to_bus.number, b.to_bus.name]
-                            and hr.load_lf.ss.branch_id == b.branch_id
-                        ),
-                        None,
-                    )
-
-                if isinstance(hr.load_lf.ss, TrafoLF):
-                    m.load_lf_trafo_id = next(
-                        (
-                            t.id
-                            for t in trafos
-                            if hr.load_lf.ss.from_number
-                            in [t.from_bus.number, t.from_bus.name]
-                            and hr.load_lf.ss.to_number
-                            in [t.to_bus.number, t.to_bus.name]
-                            and hr.load_lf.ss.trafo_id == t.trafo_id
-                        ),
-                        None,
-                    )
-
-            if hr.gen_lf:
-                m.gen_lf_v = hr.gen_lf.v
-
-                if isinstance(hr.gen_lf.ss, BranchLF):
-                    m.gen_lf_branch_id = next(
-                        (
-                            b.id
-                            for b in branches
-                            if hr.gen_lf.ss.from_number
-                            in [b.from_bus.number, b.from_bus.name]
-                            and hr.gen_lf.ss.to_number
-                            in [b.to_bus.number, b.to_bus.name]
-                            and hr.gen_lf.ss.branch_id == b.branch_id
-                        ),
-                        None,
-                    )
-
-                if isinstance(hr.gen_lf.ss, TrafoLF):
-                    m.gen_lf_trafo_id = next(
-                        (
-                            t.id
-                            for t in trafos
-                            if hr.gen_lf.ss.from_number
-                            in [t.from_bus.number, t.from_bus.name]
-                            and hr.gen_lf.ss.to_number
-                            in [t.to_bus.number, t.to_bus.name]
-                            and hr.gen_lf.ss.trafo_id == t.trafo_id
-                        ),
-                        None,
-                    )
-
-            self.session.add(m)
+        await bulk_insert(self.session, BusHeadroom, rows)
 
         await self.session.execute(
             update(ConnectionScenario)
@@ -121,34 +184,61 @@ class ScenarioHeadroomService:
 
         await self.session.commit()
 
-    async def _subsystems(self, net_id: uuid.UUID):
-        buses_result = await self.session.execute(
-            select(Bus)
-            .options(load_only(Bus.id, Bus.number, Bus.name))
-            .filter(
-                Bus.net_id == net_id,
-            )
+        logging.info(
+            f"scenario {scenario_id}: saved {len(rows)} of {len(data.headroom)} bus headrooms in {time.time() - started:.2f}s"
         )
-        buses = list(buses_result.scalars().all())
-
-        BranchBusFrom = aliased(Bus)
-        BranchBusTo = aliased(Bus)
-        branches_result = await self.session.scalars(
-            select(Branch)
-            .join(BranchBusFrom, Branch.from_bus)
-            .join(BranchBusTo, Branch.to_bus)
-            .where(BranchBusFrom.net_id == net_id, BranchBusTo.net_id == net_id)
+
+    async def begin_scenario_headroom_stream(
+        self, scenario_id: uuid.UUID, solver_task_id: str
+    ) -> Tuple[SubsystemsIndex, Set[str]]:
+        """Prepare scenario for headroom written in chunks by solver task
+
+        Headroom left by other calculations is removed. Rows written earlier by
+        the same task are kept, their bus numbers are returned to resume calculation.
+        """
+        net_id = await self._scenario_net_id(scenario_id)
+        index = await SubsystemsIndex.load(self.session, net_id)
+
+        await self.session.execute(
+            delete(BusHeadroom).where(
+                BusHeadroom.scenario_id == scenario_id,
+                BusHeadroom.solver_task_id.is_distinct_from(solver_task_id),
+            )
         )
-        branches = list(branches_result.all())
-
-        TrafoBusFrom = aliased(Bus)
-        TrafoBusTo = aliased(Bus)
-        trafos_result = await self.session.scalars(
-            select(Trafo)
-            .join(TrafoBusFrom, Trafo.from_bus)
-            .join(TrafoBusTo, Trafo.to_bus)
-            .where(TrafoBusFrom.net_id == net_id, TrafoBusTo.net_id == net_id)
+
+        persisted = await self.session.scalars(
+            select(Bus.number)
+            .join(BusHeadroom, BusHeadroom.bus_id == Bus.id)
+            .where(BusHeadroom.scenario_id == scenario_id)
         )
-        trafos = list(trafos_result.all())
+        bus_numbers = set(persisted.all())
+
+        await self.session.commit()
+        return index, bus_numbers
+
+    async def append_scenario_headroom(
+        self,
+        scenario_id: uuid.UUID,
+        items: List[BusHeadroomSchema],
+        index: SubsystemsIndex,
+        solver_task_id: str,
+    ) -> int:
+        rows = []
+        for hr in items:
+            row = index.headroom_row(scenario_id, hr, solver_task_id)
+            if not row:
+                logging.error(f"Failed to link headroom to subsystems: {hr}")
+                continue
+            rows.append(row)
 
-        return buses, branches, trafos
+        await bulk_insert(self.session, BusHeadroom, rows)
+        await self.session.commit()
+        return len(rows)
+
+    async def complete_scenario_headroom(self, scenario_id: uuid.UUID):
+        await self.session.execute(
+            update(ConnectionScenario)
+            .where(ConnectionScenario.id == scenario_id)
+            .values(solver_task_status=states.SUCCESS)
+        )
+        await self.session.commit()
@@ -1,11 +1,15 @@
 import logging
+from typing import Annotated
 
 import redis.asyncio as redis
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from fastapi.responses import RedirectResponse
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..auth.dependencies import get_current_user
+from ..auth.schemas import AuthzScopes, OIDCIdentity
+from ..cache.dependencies import get_cache_metrics, get_redis
 from ..config import settings
 from ..database.dependencies import get_db_session
 from ..tasks import celeryconfig
@@ -29,3 +33,15 @@ async def healthcheck(sess: AsyncSession = Depends(get_db_session)):
 
     logging.info(f"healthcheck: postgres={db_version}, redis={redis_version}")
     return {"version": f"{settings.APP_VERSION}-{settings.APP_COMMIT}"}
+
+
+@router.get("/api/healthcheck/cache")
+async def cache_metrics(
+    usr: Annotated[
+        OIDCIdentity,
+        Depends(get_current_user(required_permissions=[AuthzScopes.NET_ADMIN])),
+    ],
+    request: Request,
+):
+    """Hits, misses and compute time of cached endpoints"""
+    return await get_cache_metrics(get_redis(request))
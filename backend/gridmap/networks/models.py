@@ -10,7 +10,6 @@ from sqlalchemy.sql import func
 
 from ..database.columns import GeometryJSON, timestamp
 from ..database.core import Base
-from ..schemas.geo import GeoFeature, LineStringGeometry, PointGeometry
 
 if TYPE_CHECKING:
     from ..scenarios.models import ConnectionScenario
@@ -40,6 +39,19 @@ class Network(Base):
     gridcapacity_cfg: Mapped[Optional[dict[str, Any]]]
     solver_backend: Mapped[Optional[str]]
 
+    # incremented whenever subsystems or geodata are imported,
+    # part of cache keys of network layers
+    subsystems_version: Mapped[int] = mapped_column(default=0, server_default="0")
+    # incremented on changes of connection requests and scenarios
+    connections_version: Mapped[int] = mapped_column(default=0, server_default="0")
+    # content hashes of imported source files by part, e.g. subsystems, geodata
+    source_hashes: Mapped[Optional[dict[str, Any]]]
+
+    # extent of network buses, maintained on geodata import
+    geom: Mapped[Optional[GeometryJSON]] = mapped_column(
+        GeometryJSON("GEOMETRY", srid=4326, nullable=True, spatial_index=False)
+    )
+
     default_scenario_id: Mapped[Optional[UUID]] = mapped_column(
         ForeignKey("scenarios.id", ondelete="SET NULL"), nullable=True
     )
@@ -84,38 +96,6 @@ class Bus(Base):
 
     headrooms: Mapped[List["BusHeadroom"]] = relationship(lazy="noload")
 
-    def to_feature(self):
-        props = self.to_dict()
-        geometry = props.pop("geom")
-
-        del props["actual_load_mva"]
-        del props["actual_gen_mva"]
-
-        if not geometry:
-            raise ValueError(f"Bus {self.id} has no geodata")
-
-        if len(self.headrooms) == 1:
-            hr = self.headrooms[0].to_dict()
-
-            for k in [
-                "id",
-                "created_at",
-                "updated_at",
-                "scenario_id",
-                "scenario",
-                "bus_id",
-                "bus",
-            ]:
-                if k in hr:
-                    hr.pop(k)
-
-            props["headroom"] = hr
-
-        return GeoFeature[PointGeometry](
-            geometry=PointGeometry.parse_raw(geometry),
-            properties=props,
-        )
-
 
 class Branch(Base):
     __tablename__ = "network_branches"
@@ -154,17 +134,6 @@ class Branch(Base):
 
         return d
 
-    def to_feature(self):
-        props = self.to_dict()
-        geometry = props.pop("geom")
-        if not geometry:
-            raise ValueError(f"Branch {self.id} has no geodata")
-
-        return GeoFeature[LineStringGeometry](
-            geometry=LineStringGeometry.parse_raw(geometry),
-            properties=props,
-        )
-
 
 class Trafo(Base):
     __tablename__ = "network_trafos"
@@ -204,17 +173,6 @@ class Trafo(Base):
 
         return d
 
-    def to_feature(self):
-        props = self.to_dict()
-        geometry = props.pop("geom")
-        if not geometry:
-            raise ValueError(f"Trafo {self.id} has no geodata")
-
-        return GeoFeature[LineStringGeometry](
-            geometry=LineStringGeometry.parse_raw(geometry),
-            properties=props,
-        )
-
 
 class Trafo3w(Base):
     """3-winding trafos"""
@@ -265,14 +223,3 @@ class Trafo3w(Base):
             }
 
         return d
-
-    def to_feature(self):
-        props = self.to_dict()
-        geometry = props.pop("geom")
-        if not geometry:
-            raise ValueError(f"3-winding trafo {self.id} has no geodata")
-
-        return GeoFeature[LineStringGeometry](
-            geometry=LineStringGeometry.parse_raw(geometry),
-            properties=props,
-        )
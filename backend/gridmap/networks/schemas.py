@@ -160,6 +160,13 @@ class SubsystemTypeEnum(str, Enum):
     TRAFO_3W = "trafo3w"
 
 
+class TileLayerEnum(str, Enum):
+    BUSES = "buses"
+    BRANCHES = "branches"
+    TRAFOS = "trafos"
+    CONNECTIONS = "connections"
+
+
 class SubsystemGeoProps(BaseModel):
     typ: SubsystemTypeEnum
     number: Optional[str] = None
@@ -1,82 +1,276 @@
 import datetime
 import logging
+import time
 import uuid
-from typing import List, Optional
+from collections import defaultdict
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple, Type, Union
 
-from sqlalchemy import and_, delete, or_, select, text
+from sqlalchemy import and_, case, delete, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import NoResultFound
-from sqlalchemy.orm import contains_eager, joinedload
+from sqlalchemy.orm import aliased
 
+from ..connections.models import (
+    ConnectionEnergyKindEnum,
+    ConnectionKindEnum,
+    ConnectionStatusEnum,
+)
 from ..database.dependencies import DatabaseSession
-from ..headroom.models import BusHeadroom
-from ..schemas.geo import (
-    LinesGeoJson,
-    LineStringGeometry,
-    PointGeometry,
-    PointsGeoJson,
-    PolygonGeometry,
+from ..database.helpers import (
+    BULK_CHUNK_SIZE,
+    bulk_update_geometry,
+    geojson_feature,
+    geojson_feature_collection,
+    json_object,
+    sync_rows,
 )
-from .models import Branch, Bus, Network, Trafo, Trafo3w
+from ..headroom.models import BusHeadroom
+from ..schemas.geo import LineStringGeometry, PointGeometry, PolygonGeometry
+from .models import Branch, Bus, BusType, Network, Trafo, Trafo3w
 from .schemas import (
     SerializedNetwork,
     SerializedSubsystems,
+    SubsystemGeoFeature,
     SubsystemGeoJson,
     SubsystemTypeEnum,
+    TileLayerEnum,
+)
+
+# vector tiles are built in web mercator with default extent of 4096,
+# features within margin around tile are clipped into it to avoid seams
+TILE_MARGIN = 0.0625
+TILE_GEOM = (
+    "ST_AsMVTGeom(ST_Transform({t}.geom, 3857), ST_TileEnvelope(:z, :x, :y)) AS geom"
+)
+TILE_FILTER = (
+    "{t}.geom && ST_Transform(ST_TileEnvelope(:z, :x, :y, margin => "
+    + str(TILE_MARGIN)
+    + "), 4326)"
 )
 
 
+def enum_value_case(column: str, enum: Type[Enum]) -> str:
+    """SQL expression mapping enum names, stored by SQLAlchemy, to enum values"""
+    whens = " ".join(
+        f"WHEN '{x.name}' THEN "
+        + (str(x.value) if isinstance(x.value, int) else f"'{x.value}'")
+        for x in enum
+    )
+    return f"CASE {column} {whens} END"
+
+
+BUS_TYPE_CASE = enum_value_case("b.bus_type", BusType)
+
+# layer features with scalar attributes only, geometry is always named `geom`
+TILE_LAYERS_SQL = {
+    TileLayerEnum.BUSES: f"""
+        SELECT b.id::text AS id, b.number, b.name, {BUS_TYPE_CASE} AS bus_type,
+            b.base_kv, b.voltage_pu, {TILE_GEOM.format(t="b")}
+        FROM network_buses b
+        WHERE b.net_id = :net_id AND {TILE_FILTER.format(t="b")}
+    """,
+    TileLayerEnum.BRANCHES: f"""
+        SELECT br.id::text AS id, br.branch_id, br.in_service,
+            fb.number AS from_bus, tb.number AS to_bus, {TILE_GEOM.format(t="br")}
+        FROM network_branches br
+        JOIN network_buses fb ON fb.id = br.from_bus_id
+        JOIN network_buses tb ON tb.id = br.to_bus_id
+        WHERE fb.net_id = :net_id AND {TILE_FILTER.format(t="br")}
+    """,
+    TileLayerEnum.TRAFOS: f"""
+        SELECT tr.id::text AS id, tr.trafo_id, tr.in_service, {TILE_GEOM.format(t="tr")}
+        FROM network_trafos tr
+        JOIN network_buses b ON b.id = tr.from_bus_id
+        WHERE b.net_id = :net_id AND {TILE_FILTER.format(t="tr")}
+        UNION ALL
+        SELECT tr.id::text AS id, tr.trafo_id, tr.in_service, {TILE_GEOM.format(t="tr")}
+        FROM network_trafos_3w tr
+        JOIN network_buses b ON b.id = tr.w1_bus_id
+        WHERE b.net_id = :net_id AND {TILE_FILTER.format(t="tr")}
+    """,
+    TileLayerEnum.CONNECTIONS: f"""
+        SELECT cr.id::text AS id, cr.project_id,
+            {enum_value_case("cr.status", ConnectionStatusEnum)} AS status,
+            {enum_value_case("cr.connection_kind", ConnectionKindEnum)}
+                AS connection_kind,
+            {enum_value_case("cr.connection_energy_kind", ConnectionEnergyKindEnum)}
+                AS connection_energy_kind,
+            cr.power_total, cr.power_increase, b.number AS bus,
+            {TILE_GEOM.format(t="cr")}
+        FROM connection_requests cr
+        JOIN network_buses b ON b.id = cr.bus_id
+        WHERE b.net_id = :net_id AND {TILE_FILTER.format(t="cr")}
+    """,
+}
+
+
 class NetworkSubsystemsService:
     def __init__(self, session: DatabaseSession):
         self.session = session
 
-    async def find_buses_geojson(
+    async def subsystems_cache_suffix(
         self, net_id: uuid.UUID, scenario_id: Optional[uuid.UUID] = None
-    ):
-        stmt = select(Bus).filter(Bus.net_id == net_id)
+    ) -> str:
+        """Cache suffix of network layers, changes on each subsystems import"""
+        version = await self.session.scalar(
+            select(Network.subsystems_version).filter(Network.id == net_id)
+        )
+        suffix = f"v{version}"
 
         if scenario_id:
-            stmt = (
-                select(Bus)
-                .join(
-                    BusHeadroom,
-                    and_(
-                        BusHeadroom.bus_id == Bus.id,
-                        BusHeadroom.scenario_id == scenario_id,
-                    ),
+            # headroom is replaced or appended by solver while it is running
+            (count, updated_at) = (
+                await self.session.execute(
+                    select(func.count(), func.max(BusHeadroom.updated_at)).filter(
+                        BusHeadroom.scenario_id == scenario_id
+                    )
                 )
-                .options(contains_eager(Bus.headrooms))
-                .filter(Bus.net_id == net_id)
-            )
+            ).one()
+            if updated_at:
+                suffix += f"_{count}_{updated_at.timestamp()}"
 
-        items = (await self.session.scalars(stmt)).unique()
-        return PointsGeoJson(features=[x.to_feature() for x in items if x.geom])
+        return suffix
 
-    async def find_branches_geojson(self, net_id: uuid.UUID):
-        branches = await self.session.scalars(
-            select(Branch).join(
-                Bus, and_(Bus.id == Branch.from_bus_id, Bus.net_id == net_id)
-            )
+    async def connections_cache_suffix(self, net_id: uuid.UUID) -> str:
+        """Cache suffix of connection requests, changes on each mutation"""
+        version = await self.session.scalar(
+            select(Network.connections_version).filter(Network.id == net_id)
+        )
+        return f"v{version}"
+
+    async def tile_cache_suffix(self, net_id: uuid.UUID, layer: TileLayerEnum) -> str:
+        if layer == TileLayerEnum.CONNECTIONS:
+            return await self.connections_cache_suffix(net_id)
+        return await self.subsystems_cache_suffix(net_id)
+
+    async def find_tile(
+        self, net_id: uuid.UUID, layer: TileLayerEnum, z: int, x: int, y: int
+    ) -> bytes:
+        """Mapbox Vector Tile of network layer, built by PostGIS"""
+        stmt = text(
+            f"SELECT ST_AsMVT(t, '{layer.value}', 4096, 'geom') "
+            f"FROM ({TILE_LAYERS_SQL[layer]}) t WHERE t.geom IS NOT NULL"
+        )
+        return await self.session.scalar(
+            stmt, {"net_id": net_id, "z": z, "x": x, "y": y}
         )
-        return LinesGeoJson(features=[x.to_feature() for x in branches if x.geom])
 
-    async def find_trafos_geojson(self, net_id: uuid.UUID):
-        trafos = await self.session.scalars(
-            select(Trafo).join(Bus, Trafo.from_bus).filter(Bus.net_id == net_id)
+    async def update_network_bounds(self, net_id: uuid.UUID):
+        await self.session.execute(
+            text(
+                "UPDATE networks SET geom = ("
+                "SELECT ST_SetSRID(ST_Extent(geom)::geometry, 4326) "
+                "FROM network_buses WHERE net_id = :net_id"
+                ") WHERE id = :net_id"
+            ),
+            {"net_id": net_id},
         )
-        trafos3w = await self.session.scalars(
-            select(Trafo3w).join(Bus, Trafo3w.w1_bus).filter(Bus.net_id == net_id)
+
+    async def bump_connections_version(self, net_id: uuid.UUID):
+        """Invalidate cached connection requests, applied on commit"""
+        await self.session.execute(
+            update(Network)
+            .filter(Network.id == net_id)
+            .values(connections_version=Network.connections_version + 1)
         )
 
-        tr_collection = LinesGeoJson(
-            features=[x.to_feature() for x in trafos if x.geom]
+    async def update_source_hashes(self, net_id: uuid.UUID, **hashes: str):
+        """Record content hashes of imported source files, applied on commit"""
+        net = (
+            await self.session.execute(select(Network).where(Network.id == net_id))
+        ).scalar_one()
+        net.source_hashes = {**(net.source_hashes or {}), **hashes}
+
+    async def bump_subsystems_version(self, net_id: uuid.UUID):
+        await self.session.execute(
+            update(Network)
+            .filter(Network.id == net_id)
+            .values(subsystems_version=Network.subsystems_version + 1)
         )
-        tr3w_collection = LinesGeoJson(
-            features=[x.to_feature() for x in trafos3w if x.geom]
+
+    async def find_buses_geojson_raw(
+        self, net_id: uuid.UUID, scenario_id: Optional[uuid.UUID] = None
+    ) -> str:
+        """
+        GeoJSON FeatureCollection of buses with geodata, serialized by Postgres.
+        Given scenario, only buses with its headroom are included, along with it.
+        """
+        props: Dict[str, Any] = {
+            c.key: c
+            for c in Bus.__table__.c
+            if c.key not in ("geom", "actual_load_mva", "actual_gen_mva")
+        }
+        # enum is stored by name, but serialized by value
+        props["bus_type"] = case({x: x.value for x in BusType}, value=Bus.bus_type)
+
+        stmt = select().select_from(Bus).filter(Bus.net_id == net_id)
+
+        if scenario_id:
+            props["headroom"] = json_object(
+                **{
+                    c.key: c
+                    for c in BusHeadroom.__table__.c
+                    if c.key
+                    not in ("id", "created_at", "updated_at", "scenario_id", "bus_id")
+                }
+            )
+            stmt = stmt.join(
+                BusHeadroom,
+                and_(
+                    BusHeadroom.bus_id == Bus.id,
+                    BusHeadroom.scenario_id == scenario_id,
+                ),
+            )
+
+        features = stmt.add_columns(
+            geojson_feature(Bus.geom, json_object(**props)).label("feature")
+        ).filter(Bus.geom.is_not(None))
+
+        return await self.session.scalar(geojson_feature_collection(features))
+
+    async def find_branches_geojson_raw(self, net_id: uuid.UUID) -> str:
+        """GeoJSON FeatureCollection of branches with geodata, serialized by Postgres"""
+        return await self.session.scalar(
+            geojson_feature_collection(
+                self._lines_features(Branch, "branch_id", net_id)
+            )
         )
 
-        tr_collection.features.extend(tr3w_collection.features)
+    async def find_trafos_geojson_raw(self, net_id: uuid.UUID) -> str:
+        """
+        GeoJSON FeatureCollection of 2 and 3 winding trafos with geodata,
+        serialized by Postgres
+        """
+        return await self.session.scalar(
+            geojson_feature_collection(
+                self._lines_features(Trafo, "trafo_id", net_id),
+                self._lines_features(Trafo3w, "trafo_id", net_id),
+            )
+        )
 
-        return tr_collection
+    @staticmethod
+    def _lines_features(model, id_key: str, net_id: uuid.UUID):
+        if model is Trafo3w:
+            ends = ["w1_bus", "w2_bus", "w3_bus"]
+        else:
+            ends = ["from_bus", "to_bus"]
+
+        props: Dict[str, Any] = {c.key: c for c in model.__table__.c if c.key != "geom"}
+        stmt = select().select_from(model)
+
+        for end in ends:
+            EndBus = aliased(Bus)
+            stmt = stmt.join(EndBus, getattr(model, f"{end}_id") == EndBus.id)
+            props[end] = json_object(
+                id=EndBus.id, number=EndBus.number, name=EndBus.name
+            )
+            if end in ("from_bus", "w1_bus"):
+                stmt = stmt.filter(EndBus.net_id == net_id)
+
+        return stmt.add_columns(
+            geojson_feature(model.geom, json_object(**props)).label("feature")
+        ).filter(model.geom.is_not(None))
 
     async def list_networks(self, ids: Optional[List[str]] = None):
         stmt = select(Network)
@@ -85,23 +279,14 @@ class NetworkSubsystemsService:
 
         nets = await self.session.scalars(stmt)
 
-        # TODO select with join or subquery along with networks
-        bounds_stmt = text(
-            "SELECT net_id, ST_AsGeoJSON(ST_Envelope(ST_Union(geom))) AS table_extent FROM network_buses GROUP BY net_id"
-        )
-        bounds = (await self.session.execute(bounds_stmt)).all()
-
         items: List[SerializedNetwork] = []
         for x in nets.all():
-            m = SerializedNetwork.model_validate(x.to_dict())
-            m.geom = next(
-                (
-                    PolygonGeometry.model_validate_json(geom)
-                    for (net_id, geom) in bounds
-                    if net_id == x.id and geom
-                ),
-                None,
-            )
+            d = x.to_dict()
+            geom = d.pop("geom")
+
+            m = SerializedNetwork.model_validate(d)
+            if geom:
+                m.geom = PolygonGeometry.model_validate_json(geom)
             items.append(m)
 
         return items
@@ -139,180 +324,253 @@ class NetworkSubsystemsService:
         self.session.add(model)
         await self.session.commit()
 
-    async def import_subsystems(self, net_id: uuid.UUID, payload: SerializedSubsystems):
-        async def find_bus(*expr):
-            res = await self.session.execute(
-                select(Bus).where(Bus.net_id == net_id, *expr)
+    async def import_subsystems(
+        self, net_id: uuid.UUID, payload: SerializedSubsystems
+    ) -> Dict[str, int]:
+        """Update network subsystems in place within single transaction
+
+        Buses are upserted by number, so that unchanged buses keep their ids along
+        with headrooms and connection requests referring them. Branches and trafos
+        are diffed against existing ones, buses missing in payload are deleted.
+        """
+        stats: Dict[str, int] = {}
+
+        def log_stage(stage: str, rows: int, started: float, **counts: int):
+            elapsed = time.time() - started
+            rate = rows / elapsed if elapsed > 0 else rows
+            logging.info(
+                f"net {net_id}: {stage} {rows} rows in {elapsed:.2f}s ({rate:.0f} rows/s)"
+                + "".join(f", {k}={v}" for k, v in counts.items())
             )
-            return res.scalar_one()
-
-        await self.session.execute(delete(Bus).where(Bus.net_id == net_id))
+            stats[stage] = rows
+            stats.update({f"{stage}_{k}": v for k, v in counts.items()})
+
+        bus_ids: Dict[str, uuid.UUID] = {}
+
+        def bus_id(number: Union[str, int]):
+            try:
+                return bus_ids[str(number)]
+            except KeyError:
+                raise NoResultFound(f"Bus '{number}' is missing in network {net_id}")
+
+        # Upsert buses
+        started = time.time()
+        existing_buses: Dict[str, uuid.UUID] = {
+            number: id
+            for id, number in await self.session.execute(
+                select(Bus.id, Bus.number).where(Bus.net_id == net_id)
+            )
+        }
 
-        # Add buses
+        bus_rows = []
         for pb in payload.buses:
-            b = Bus(**pb.model_dump())
-            b.net_id = net_id  # type: ignore
-            self.session.add(b)
-
-        await self.session.commit()
-
-        # Add branches
-        for pbr in payload.branches:
-            br = Branch()
-
-            br.from_bus = await find_bus(Bus.number == pbr.from_number)
-            br.to_bus = await find_bus(Bus.number == pbr.to_number)
-
-            br.in_service = pbr.in_service
-            br.branch_id = pbr.branch_id
-            self.session.add(br)
-
-        await self.session.commit()
-
-        # Add trafos
-        for pt in payload.trafos:
-            t = Trafo()
-
-            t.from_bus = await find_bus(Bus.number == pt.from_number)
-            t.to_bus = await find_bus(Bus.number == pt.to_number)
-
-            t.in_service = pt.in_service
-            t.trafo_id = pt.trafo_id
-            self.session.add(t)
-
-        await self.session.commit()
-
-        # Add 3 winding trafos
-        for pt3w in payload.trafos3w:
-            t3w = Trafo3w()
-
-            t3w.w1_bus = await find_bus(Bus.number == pt3w.wind1_number)
-            t3w.w2_bus = await find_bus(Bus.number == pt3w.wind2_number)
-            t3w.w3_bus = await find_bus(Bus.number == pt3w.wind3_number)
-
-            t3w.in_service = pt3w.in_service
-            t3w.trafo_id = pt3w.trafo_id
+            row = pb.model_dump()
+            row["net_id"] = net_id
+            bus_rows.append(row)
+
+        bus_columns = (
+            [k for k in bus_rows[0] if k not in ("number", "net_id")]
+            if bus_rows
+            else []
+        )
+        for i in range(0, len(bus_rows), BULK_CHUNK_SIZE):
+            insert_stmt = pg_insert(Bus).values(bus_rows[i : i + BULK_CHUNK_SIZE])
+            upsert_stmt = insert_stmt.on_conflict_do_update(
+                constraint="_bus_number_net_id",
+                set_={k: insert_stmt.excluded[k] for k in bus_columns},
+            ).returning(Bus.id, Bus.number)
+            for id, number in await self.session.execute(upsert_stmt):
+                bus_ids[number] = id
+
+        stale_bus_ids = [id for n, id in existing_buses.items() if n not in bus_ids]
+        for i in range(0, len(stale_bus_ids), BULK_CHUNK_SIZE):
+            await self.session.execute(
+                delete(Bus).where(Bus.id.in_(stale_bus_ids[i : i + BULK_CHUNK_SIZE]))
+            )
 
-            self.session.add(t3w)
+        log_stage(
+            "buses",
+            len(bus_rows),
+            started,
+            inserted=len(bus_ids.keys() - existing_buses.keys()),
+            deleted=len(stale_bus_ids),
+        )
+        net_bus_ids = select(Bus.id).where(Bus.net_id == net_id)
+
+        # Sync branches
+        started = time.time()
+        branch_rows = [
+            {
+                "from_bus_id": bus_id(pbr.from_number),
+                "to_bus_id": bus_id(pbr.to_number),
+                "branch_id": pbr.branch_id,
+                "in_service": pbr.in_service,
+            }
+            for pbr in payload.branches
+        ]
+        counts = await sync_rows(
+            self.session,
+            Branch,
+            branch_rows,
+            key=("from_bus_id", "to_bus_id", "branch_id"),
+            scope=Branch.from_bus_id.in_(net_bus_ids),
+        )
+        log_stage("branches", len(branch_rows), started, **counts)
+
+        # Sync trafos
+        started = time.time()
+        trafo_rows = [
+            {
+                "from_bus_id": bus_id(pt.from_number),
+                "to_bus_id": bus_id(pt.to_number),
+                "trafo_id": pt.trafo_id,
+                "in_service": pt.in_service,
+            }
+            for pt in payload.trafos
+        ]
+        counts = await sync_rows(
+            self.session,
+            Trafo,
+            trafo_rows,
+            key=("from_bus_id", "to_bus_id", "trafo_id"),
+            scope=Trafo.from_bus_id.in_(net_bus_ids),
+        )
+        log_stage("trafos", len(trafo_rows), started, **counts)
+
+        # Sync 3 winding trafos
+        started = time.time()
+        trafo3w_rows = [
+            {
+                "w1_bus_id": bus_id(pt3w.wind1_number),
+                "w2_bus_id": bus_id(pt3w.wind2_number),
+                "w3_bus_id": bus_id(pt3w.wind3_number),
+                "trafo_id": pt3w.trafo_id,
+                "in_service": pt3w.in_service,
+            }
+            for pt3w in payload.trafos3w
+        ]
+        counts = await sync_rows(
+            self.session,
+            Trafo3w,
+            trafo3w_rows,
+            key=("w1_bus_id", "w2_bus_id", "w3_bus_id", "trafo_id"),
+            scope=Trafo3w.w1_bus_id.in_(net_bus_ids),
+        )
+        log_stage("trafos3w", len(trafo3w_rows), started, **counts)
 
+        await self.update_network_bounds(net_id)
+        await self.bump_subsystems_version(net_id)
+        if stale_bus_ids:
+            # connection requests of deleted buses are gone with them
+            await self.bump_connections_version(net_id)
         await self.session.commit()
+        return stats
 
     async def import_subsystem_geodata(
         self, net_id: uuid.UUID, payload: SubsystemGeoJson
-    ):
-        network_buses = list(
-            await self.session.scalars(select(Bus).filter(Bus.net_id == net_id))
-        )
-        network_bus_ids = [x.id for x in network_buses]
+    ) -> Dict[str, int]:
+        buses = (
+            await self.session.execute(
+                select(Bus.id, Bus.number, Bus.geom).filter(Bus.net_id == net_id)
+            )
+        ).all()
 
-        if not len(network_bus_ids):
+        if not len(buses):
             raise NoResultFound
 
-        bus_features = [
-            x for x in payload.features if x.properties.typ == SubsystemTypeEnum.BUS
-        ]
-        branch_features = [
-            x for x in payload.features if x.properties.typ == SubsystemTypeEnum.BRANCH
-        ]
-        trafo_features = [
-            x for x in payload.features if x.properties.typ == SubsystemTypeEnum.TRAFO
-        ]
+        # Index features by bus number and by (from_number, to_number)
+        bus_features: Dict[str, SubsystemGeoFeature] = {}
+        branch_features: Dict[Tuple[str, str], SubsystemGeoFeature] = {}
+        trafo_features: Dict[Tuple[str, str], SubsystemGeoFeature] = {}
+        # coordinates of line ends, used when bus has no own geometry
+        branch_ends: Dict[str, Tuple[float, float]] = {}
+
+        for f in payload.features:
+            p = f.properties
+            if p.typ == SubsystemTypeEnum.BUS and p.number:
+                bus_features.setdefault(p.number, f)
+            elif p.typ == SubsystemTypeEnum.BRANCH:
+                branch_features.setdefault((p.from_number, p.to_number), f)  # type: ignore
+                if p.from_number:
+                    branch_ends.setdefault(p.from_number, f.geometry.coordinates[0])  # type: ignore
+                if p.to_number:
+                    branch_ends.setdefault(p.to_number, f.geometry.coordinates[-1])  # type: ignore
+            elif p.typ == SubsystemTypeEnum.TRAFO:
+                trafo_features.setdefault((p.from_number, p.to_number), f)  # type: ignore
+
+        stats: Dict[str, int] = defaultdict(int)
 
         # Update bus geometry
-        for bus in network_buses:
-            bus_f = next(
-                (x for x in bus_features if x.properties.number == bus.number), None
-            )
+        bus_coords: Dict[str, Tuple[float, float]] = {}
+        bus_geoms: Dict[uuid.UUID, Dict[str, Any]] = {}
 
-            if bus_f:
-                bus.geom = bus_f.geometry.model_dump()  # type: ignore
-                logging.debug(f"-> update bus {bus.id} geom to {bus.geom}")
-            else:
-                br = next(
-                    (
-                        x
-                        for x in branch_features
-                        if x.properties.from_number == bus.number
-                        or x.properties.to_number == bus.number
-                    ),
-                    None,
-                )
-                if br:
-                    c = br.geometry.coordinates[
-                        0 if bus.number == br.properties.from_number else -1
-                    ]
-                    bus.geom = PointGeometry(coordinates=c).model_dump()  # type: ignore
+        for bus_id, number, geom in buses:
+            bus_f = bus_features.get(number)
 
-        await self.session.flush()
+            if bus_f:
+                bus_geoms[bus_id] = bus_f.geometry.model_dump()
+                bus_coords[number] = bus_f.geometry.coordinates  # type: ignore
+                stats["buses_matched"] += 1
+            elif number in branch_ends:
+                c = branch_ends[number]
+                bus_geoms[bus_id] = PointGeometry(coordinates=c).model_dump()
+                bus_coords[number] = c
+                stats["buses_traced"] += 1
+            elif geom:
+                bus_coords[number] = PointGeometry.model_validate_json(geom).coordinates
+
+        await bulk_update_geometry(self.session, Bus, bus_geoms)
+
+        def line_geometries(rows, features, key: str):
+            geoms: Dict[uuid.UUID, Dict[str, Any]] = {}
+
+            for row_id, from_number, to_number in rows:
+                f = features.get((from_number, to_number))
+
+                if f:
+                    geoms[row_id] = f.geometry.model_dump()
+                    stats[f"{key}_matched"] += 1
+                elif from_number in bus_coords and to_number in bus_coords:
+                    start, end = bus_coords[from_number], bus_coords[to_number]
+                    geoms[row_id] = LineStringGeometry(
+                        coordinates=[start, end]
+                    ).model_dump()
+                    stats[f"{key}_traced"] += 1
+
+            return geoms
 
         # Update branches(lines) geometry
-        network_branches = await self.session.scalars(
-            select(Branch)
-            .options(joinedload("*"))
-            .filter(
-                or_(
-                    Branch.from_bus_id.in_(network_bus_ids),
-                    Branch.to_bus_id.in_(network_bus_ids),
-                )
-            )
+        FromBus, ToBus = aliased(Bus), aliased(Bus)
+        branches = await self.session.execute(
+            select(Branch.id, FromBus.number, ToBus.number)
+            .join(FromBus, Branch.from_bus)
+            .join(ToBus, Branch.to_bus)
+            .filter(FromBus.net_id == net_id)
+        )
+        await bulk_update_geometry(
+            self.session, Branch, line_geometries(branches, branch_features, "branches")
         )
-        for br in network_branches.unique():
-            assert br  # instruct mypy that br is not None
-
-            br_f = next(
-                (
-                    x
-                    for x in branch_features
-                    if x.properties.from_number == br.from_bus.number
-                    and x.properties.to_number == br.to_bus.number
-                ),
-                None,
-            )
-
-            if br_f:
-                br.geom = br_f.geometry.model_dump()  # type: ignore
-                logging.debug(f"-> update branch {br.id} geom to {br.geom}")
-
-            elif not br_f and br.from_bus.geom and br.to_bus.geom:
-                start = PointGeometry.model_validate(br.from_bus.geom).coordinates  # type: ignore
-                end = PointGeometry.model_validate(br.to_bus.geom).coordinates  # type: ignore
-
-                br.geom = LineStringGeometry(coordinates=[start, end]).model_dump()  # type: ignore
-                logging.debug(
-                    f"-> update branch {br.id} geom to {br.geom} [auto-trace]"
-                )
 
         # Update trafos geometry
-        trafos = await self.session.scalars(
-            select(Trafo)
-            .options(joinedload("*"))
-            .filter(
-                or_(
-                    Trafo.from_bus_id.in_(network_bus_ids),
-                    Trafo.to_bus_id.in_(network_bus_ids),
-                )
-            )
+        FromBus, ToBus = aliased(Bus), aliased(Bus)
+        trafos = await self.session.execute(
+            select(Trafo.id, FromBus.number, ToBus.number)
+            .join(FromBus, Trafo.from_bus)
+            .join(ToBus, Trafo.to_bus)
+            .filter(FromBus.net_id == net_id)
+        )
+        await bulk_update_geometry(
+            self.session, Trafo, line_geometries(trafos, trafo_features, "trafos")
         )
-        for t in trafos.unique():
-            t_f = next(
-                (
-                    x
-                    for x in trafo_features
-                    if x.properties.from_number == t.from_bus.number
-                    or x.properties.to_number == t.to_bus.number
-                ),
-                None,
-            )
-            if t_f:
-                t.geom = br_f.geometry.model_dump()  # type: ignore
-                logging.debug(f"-> update trafo {t.id} geom to {t.geom}")
-
-            elif not t_f and t.from_bus.geom and t.to_bus.geom:
-                start = PointGeometry.model_validate(t.from_bus.geom).coordinates  # type: ignore
-                end = PointGeometry.model_validate(t.to_bus.geom).coordinates  # type: ignore
 
-                t.geom = LineStringGeometry(coordinates=[start, end]).model_dump()  # type: ignore
-                logging.debug(f"-> update trafo {t.id} geom to {t.geom} [auto-trace]")
+        await self.update_network_bounds(net_id)
+        await self.bump_subsystems_version(net_id)
 
         # commit changes across models within session
         await self.session.commit()
+
+        logging.info(
+            f"net {net_id}: geodata import, "
+            + ", ".join(f"{k}={v}" for k, v in sorted(stats.items()))
+        )
+        return stats
@@ -2,16 +2,20 @@ import re
 import uuid
 from typing import Annotated, List, Optional, Union
 
-from fastapi import APIRouter, Depends, Response, status
+from fastapi import APIRouter, Depends, HTTPException, Path, Response, status
 
 from ..auth.dependencies import get_current_user
 from ..auth.schemas import AuthzScopes, OIDCIdentity
+from ..cache.dependencies import cached_json_response, cached_tile_response
 from ..schemas.geo import LinesGeoJson, PointsGeoJson
 from .dependencies import NetworkSubsystemsServiceAnnotated
-from .schemas import SerializedNetwork
+from .schemas import SerializedNetwork, TileLayerEnum
 
 router = APIRouter(prefix="/nets", tags=["networks"])
 
+# layers are cached per subsystems version, new import changes cache key
+LAYERS_CACHE_TTL = 7 * 24 * 3600
+
 
 @router.get("/{net_id}/geojson/buses", response_model=PointsGeoJson)
 async def buses_geojson(
@@ -26,8 +30,15 @@ async def buses_geojson(
         ),
     ],
     scenario_id: Optional[uuid.UUID] = None,
+    cached=Depends(cached_json_response),
 ):
-    return await service.find_buses_geojson(net_id, scenario_id)
+    return await cached(
+        await service.subsystems_cache_suffix(net_id, scenario_id),
+        service.find_buses_geojson_raw,
+        ttl=LAYERS_CACHE_TTL,
+        net_id=net_id,
+        scenario_id=scenario_id,
+    )
 
 
 @router.get("/{net_id}/geojson/branches", response_model=LinesGeoJson)
@@ -42,8 +53,14 @@ async def branches_geojson(
             )
         ),
     ],
+    cached=Depends(cached_json_response),
 ):
-    return await service.find_branches_geojson(net_id)
+    return await cached(
+        await service.subsystems_cache_suffix(net_id),
+        service.find_branches_geojson_raw,
+        ttl=LAYERS_CACHE_TTL,
+        net_id=net_id,
+    )
 
 
 @router.get("/{net_id}/geojson/trafos", response_model=LinesGeoJson)
@@ -58,8 +75,54 @@ async def trafos_geojson(
             )
         ),
     ],
+    cached=Depends(cached_json_response),
 ):
-    return await service.find_trafos_geojson(net_id)
+    return await cached(
+        await service.subsystems_cache_suffix(net_id),
+        service.find_trafos_geojson_raw,
+        ttl=LAYERS_CACHE_TTL,
+        net_id=net_id,
+    )
+
+
+@router.get(
+    "/{net_id}/tiles/{layer}/{z}/{x}/{y}.mvt",
+    response_class=Response,
+    responses={200: {"content": {"application/vnd.mapbox-vector-tile": {}}}},
+)
+async def layer_tile(
+    net_id: uuid.UUID,
+    layer: TileLayerEnum,
+    service: NetworkSubsystemsServiceAnnotated,
+    usr: Annotated[
+        OIDCIdentity,
+        Depends(
+            get_current_user(
+                required_permissions=[AuthzScopes.NET_READ_BY_ID, AuthzScopes.NET_ADMIN]
+            )
+        ),
+    ],
+    z: int = Path(ge=0, le=24),
+    x: int = Path(ge=0),
+    y: int = Path(ge=0),
+    cached=Depends(cached_tile_response),
+):
+    if x >= 2**z or y >= 2**z:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Tile coordinates are out of range for zoom level",
+        )
+
+    return await cached(
+        await service.tile_cache_suffix(net_id, layer),
+        service.find_tile,
+        ttl=LAYERS_CACHE_TTL,
+        net_id=net_id,
+        layer=layer,
+        z=z,
+        x=x,
+        y=y,
+    )
 
 
 @router.get("/", response_model=List[SerializedNetwork])
@@ -15,6 +15,7 @@ from ..database.dependencies import DatabaseSession
 from ..database.helpers import get_or_create
 from ..headroom.schemas import ScenarioHeadroomSchema
 from ..headroom.service import ScenarioHeadroomService
+from ..networks.dependencies import NetworkSubsystemsServiceAnnotated
 from ..networks.schemas import UNATTENDED_SOLVER_BACKENDS
 from ..schemas.paginated import PaginatedResponse, PaginationQueryParams
 from ..tasks.celeryapp import celery
@@ -75,6 +76,7 @@ async def create_scenario(
     net_id: uuid.UUID,
     payload: ConnectionScenarioUnified,
     session: DatabaseSession,
+    net_service: NetworkSubsystemsServiceAnnotated,
 ):
     sc = ConnectionScenario()
 
@@ -107,6 +109,7 @@ async def create_scenario(
             )
 
     response = ConnectionScenarioUnified.from_sa(sc)
+    await net_service.bump_connections_version(net_id)
     await session.commit()
 
     return response
@@ -236,6 +239,7 @@ async def remove_scenario(
     scenario_id: uuid.UUID,
     service: ConnectionScenarioServiceAnnotated,
     session: DatabaseSession,
+    net_service: NetworkSubsystemsServiceAnnotated,
 ):
     s = await service.find_scenario_by_id(scenario_id)
     if s.solver_task_id and s.solver_task_status not in states.READY_STATES:
@@ -246,5 +250,6 @@ async def remove_scenario(
             ConnectionScenario.id == scenario_id, ConnectionScenario.net_id == net_id
         )
     )
+    await net_service.bump_connections_version(net_id)
     await session.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,5 +1,9 @@
+import base64
+import binascii
+import json
 from dataclasses import dataclass
-from typing import Generic, List, TypeVar
+from enum import Enum
+from typing import Any, Generic, List, Optional, TypeVar
 
 from fastapi import Query
 from pydantic import BaseModel, Field
@@ -12,9 +16,44 @@ class PaginatedResponse(BaseModel, Generic[M]):
     items: List[M] = Field(
         description="List of items returned in the response following given criteria"
     )
+    cursor: Optional[str] = Field(
+        default=None, description="Cursor of the next page, not set on the last page"
+    )
 
 
 @dataclass
 class PaginationQueryParams:
     limit: int = Query(100, ge=0)
     offset: int = Query(0, ge=0)
+
+
+class CountModeEnum(str, Enum):
+    EXACT = "exact"
+    ESTIMATE = "estimate"
+
+
+@dataclass
+class CursorPaginationQueryParams(PaginationQueryParams):
+    cursor: Optional[str] = Query(
+        None, description="Cursor of the next page from previous response"
+    )
+    count: CountModeEnum = Query(
+        CountModeEnum.EXACT,
+        description="Count matching items exactly or estimate by query planner",
+    )
+
+
+def encode_cursor(*values: Any) -> str:
+    """Opaque cursor of keyset pagination"""
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError("Malformed cursor")
+
+    if not isinstance(values, list):
+        raise ValueError("Malformed cursor")
+    return values
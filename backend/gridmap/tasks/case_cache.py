@@ -0,0 +1,158 @@
+import copy
+import logging
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Any, Callable, List, Tuple
+
+# Memory budget for network cases kept loaded by each worker process, 0 disables
+# cache. Prefork celery runs `--concurrency` processes, each with own cache, and
+# every running scenario holds deep copy of its case on top of it.
+CASE_CACHE_MAX_MB_PER_PROCESS = int(
+    os.environ.get("CASE_CACHE_MAX_MB_PER_PROCESS", 128)
+)
+
+CaseKey = Tuple[str, int, int, str]
+
+
+class CaseCache:
+    """
+    LRU cache of loaded network cases, bounded by approximate memory size.
+
+    Cases are keyed by absolute path, mtime and size of case file, so that
+    replaced files are reloaded, and by loader options `variant`. Every lookup returns deep copy of cached base,
+    scenarios modify network in place and must not leak into each other.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.items: "OrderedDict[CaseKey, Tuple[Any, int]]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(path: str, variant: str = "") -> CaseKey:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        return (path, stat.st_mtime_ns, stat.st_size, variant)
+
+    @property
+    def lookups(self) -> int:
+        return self.hits + self.misses
+
+    def get(self, path: str, load: Callable[[str], Any], variant: str = "") -> Any:
+        key = self.key(path, variant)
+
+        with self.lock:
+            cached = self.items.get(key)
+            if cached:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(cached[0])
+            self.misses += 1
+
+        base = load(path)
+        try:
+            size = len(pickle.dumps(base, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            logging.warning("case %s cannot be cached", path, exc_info=True)
+            return base
+
+        with self.lock:
+            self._put(key, base, size)
+
+        return copy.deepcopy(base)
+
+    def _put(self, key: CaseKey, base: Any, size: int):
+        if size > self.max_bytes:
+            return
+
+        # drop stale versions of the same case file
+        for k in [k for k in self.items if (k[0], k[3]) == (key[0], key[3])]:
+            self.total_bytes -= self.items.pop(k)[1]
+
+        self.items[key] = (base, size)
+        self.total_bytes += size
+
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted) = self.items.popitem(last=False)
+            self.total_bytes -= evicted
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.total_bytes = 0
+
+
+case_cache = CaseCache(CASE_CACHE_MAX_MB_PER_PROCESS * 1024 * 1024)
+
+
+def _from_json_holders(original: Callable) -> List[ModuleType]:
+    """
+    Modules referring to pandapower json loader, including gridcapacity
+    modules which imported it by name and would not see it replaced otherwise.
+    """
+    return [
+        m
+        for name, m in list(sys.modules.items())
+        if (
+            name in ("pandapower", "pandapower.file_io")
+            or name.startswith("gridcapacity")
+        )
+        and getattr(m, "from_json", None) is original
+    ]
+
+
+@contextmanager
+def cached_case_loading():
+    """
+    Serve pandapower cases loaded by gridcapacity from worker cache.
+
+    `CapacityAnalyser` accepts only case file name and loads it on its own,
+    pandapower json loader is replaced wherever it is referenced for the
+    duration of calculation. Warns when no case is loaded through it.
+    """
+    if not case_cache.max_bytes:
+        yield
+        return
+
+    import pandapower
+    import pandapower.file_io
+
+    original = pandapower.file_io.from_json
+
+    def from_json(filename, *args, **kwargs):
+        if not isinstance(filename, str):
+            return original(filename, *args, **kwargs)
+        return case_cache.get(
+            filename,
+            lambda path: original(path, *args, **kwargs),
+            variant=repr((args, sorted(kwargs.items()))),
+        )
+
+    lookups = case_cache.lookups
+    patched = _from_json_holders(original)
+    for m in patched:
+        m.from_json = from_json  # type: ignore
+    try:
+        yield
+    finally:
+        for m in patched:
+            m.from_json = original  # type: ignore
+
+    if case_cache.lookups == lookups:
+        logging.warning(
+            "case was not loaded through pandapower.from_json, cache is bypassed"
+        )
+    logging.info(
+        "case cache hits=%d misses=%d size=%dMB",
+        case_cache.hits,
+        case_cache.misses,
+        case_cache.total_bytes // (1024 * 1024),
+    )
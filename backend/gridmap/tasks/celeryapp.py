@@ -4,11 +4,20 @@ from typing import Union
 import gridmap.tasks.celeryconfig as celeryconfig
 from celery import Celery
 from celery.result import AsyncResult
-from celery.signals import task_postrun, task_prerun
+from celery.signals import (
+    task_postrun,
+    task_prerun,
+    worker_process_init,
+    worker_process_shutdown,
+)
 from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database.session import async_to_sync_session
+from ..database.session import (
+    async_to_sync_session,
+    dispose_worker_engine,
+    init_worker_engine,
+)
 from ..scenarios.models import ConnectionScenario
 
 celery = Celery(__name__)
@@ -32,6 +41,16 @@ def update_solver_status(task_id: str, status: str, err: Union[str, None] = None
 # https://docs.celeryq.dev/en/stable/reference/celery.states.html#states
 
 
+@worker_process_init.connect
+def worker_process_init_handler(*args, **kwargs):
+    init_worker_engine()
+
+
+@worker_process_shutdown.connect
+def worker_process_shutdown_handler(*args, **kwargs):
+    dispose_worker_engine()
+
+
 @task_prerun.connect
 def task_prerun_handler(sender, *args, **kwargs):
     task_id = sender.request.id
@@ -4,22 +4,34 @@ import os
 import time
 import uuid
 import warnings
-from typing import Callable
+from typing import Callable, List, Optional, Tuple
 
+from celery import chord, states
+from celery.exceptions import Ignore
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..database.session import async_to_sync_session
 from ..headroom.schemas import (
+    BusHeadroomSchema,
     GridCapacityConfig,
     GridcapacityTaskParams,
     ScenarioHeadroomSchema,
 )
 from ..headroom.service import ScenarioHeadroomService
 from ..tasks_monitor.schemas import CeleryTaskMetadata
-from .celeryapp import PROGRESS, celery
+from .case_cache import cached_case_loading
+from .celeryapp import PROGRESS, celery, update_solver_status
 
 warnings.simplefilter(action="ignore", category=FutureWarning)
 
+# Number of bus headrooms persisted at once while calculation is running,
+# 0 disables streaming and saves all headroom after calculation is complete
+HEADROOM_CHUNK_SIZE = int(os.environ.get("HEADROOM_CHUNK_SIZE", 100))
+
+# Number of tasks calculation of a scenario is split into, requires streaming.
+# Shards are dispatched as celery chord and may run on any worker process
+GRIDCAPACITY_SHARDS = int(os.environ.get("GRIDCAPACITY_SHARDS", 1))
+
 
 def save_headroom(scenario_id: uuid.UUID, data: ScenarioHeadroomSchema):
     async def async_main(session: AsyncSession):
@@ -29,7 +41,71 @@ def save_headroom(scenario_id: uuid.UUID, data: ScenarioHeadroomSchema):
     async_to_sync_session(async_main)
 
 
-def calc_headroom(cfg: GridCapacityConfig, on_progress: Callable) -> str:
+class HeadroomWriter:
+    """Persists bus headroom in chunks while calculation is running"""
+
+    def __init__(self, scenario_id: str, solver_task_id: str, chunk_size: int):
+        self.scenario_id = scenario_id
+        self.solver_task_id = solver_task_id
+        self.chunk_size = chunk_size
+        self.buffer: List[BusHeadroomSchema] = []
+        self.saved = 0
+
+        async def async_main(session: AsyncSession):
+            repo = ScenarioHeadroomService(session)
+            return await repo.begin_scenario_headroom_stream(
+                scenario_id, solver_task_id  # type: ignore
+            )
+
+        self.index, self.persisted = async_to_sync_session(async_main)
+
+    def remaining_buses(self, selected_buses_ids: Optional[List[str]]):
+        """Buses which are yet to be calculated by the task"""
+        buses = selected_buses_ids or self.index.bus_numbers
+        return [str(x) for x in buses if str(x) not in self.persisted]
+
+    def __call__(self, bus_headroom: BusHeadroomSchema):
+        self.buffer.append(bus_headroom)
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+
+        items, self.buffer = self.buffer, []
+
+        async def async_main(session: AsyncSession):
+            repo = ScenarioHeadroomService(session)
+            return await repo.append_scenario_headroom(
+                self.scenario_id, items, self.index, self.solver_task_id  # type: ignore
+            )
+
+        self.saved += async_to_sync_session(async_main)
+
+    def complete(self):
+        self.flush()
+
+        async def async_main(session: AsyncSession):
+            repo = ScenarioHeadroomService(session)
+            await repo.complete_scenario_headroom(self.scenario_id)  # type: ignore
+
+        async_to_sync_session(async_main)
+
+
+def calc_headroom(
+    cfg: GridCapacityConfig,
+    on_progress: Callable,
+    on_headroom: Optional[Callable[[BusHeadroomSchema], None]] = None,
+    completed: int = 0,
+) -> Optional[str]:
+    """
+    Run headroom calculation.
+
+    Each bus headroom is passed to `on_headroom` as soon as it is calculated,
+    otherwise all headroom is returned as json once calculation is complete.
+    `completed` is number of buses calculated earlier, it is accounted in progress.
+    """
     import gridcapacity
 
     # silence excessive logging slowing down progress
@@ -52,7 +128,9 @@ def calc_headroom(cfg: GridCapacityConfig, on_progress: Callable) -> str:
     kw.setdefault("normal_limits", None)
     kw.setdefault("contingency_limits", None)
 
-    capacity_analyser = CapacityAnalyser(**kw)
+    # base case is loaded from disk once per worker process and copied
+    with cached_case_loading():
+        capacity_analyser = CapacityAnalyser(**kw)
 
     headroom = []
     generate, total = capacity_analyser.create_buses_headroom_generator()
@@ -60,25 +138,30 @@ def calc_headroom(cfg: GridCapacityConfig, on_progress: Callable) -> str:
     for i, (bus_headroom, powerflow_count) in enumerate(generate()):
         stats = CeleryTaskMetadata.parse_obj(
             {
-                "progress": round(i / total * 100),
+                "progress": round((completed + i) / (completed + total) * 100),
                 "powerflows": powerflow_count,
                 "updated_at": int(time.time()),
             }
         )
-        headroom.append(bus_headroom)
+        if on_headroom:
+            on_headroom(
+                BusHeadroomSchema.parse_raw(
+                    json.dumps(bus_headroom, **json_dump_kwargs)
+                )
+            )
+        else:
+            headroom.append(bus_headroom)
         on_progress(stats)
 
+    if on_headroom:
+        return None
+
     return json.dumps({"headroom": headroom}, **json_dump_kwargs)
 
 
-@celery.task(
-    bind=True,
-    autoretry_for=(Exception,),
-    dont_autoretry_for=(RuntimeError,),
-    retry_backoff=2,
-    max_retries=1,
-)
-def run_solver(self, data: str, only_affected_buses: bool = False):
+def load_task_config(
+    data: str, only_affected_buses: bool = False
+) -> Tuple[GridCapacityConfig, str]:
     params = GridcapacityTaskParams.parse_raw(data)
 
     if not params.gridcapacityConfig:
@@ -94,6 +177,28 @@ def run_solver(self, data: str, only_affected_buses: bool = False):
     if only_affected_buses and cfg.connection_scenario:
         cfg.selected_buses_ids = [str(x) for x in cfg.connection_scenario.keys()]
 
+    return cfg, scenario_id
+
+
+def shards_progress_key(solver_task_id: str):
+    return f"gridcapacity-shards-{solver_task_id}"
+
+
+def shards_done_key(solver_task_id: str):
+    """Set of calculated bus numbers, buses calculated again on retry count once"""
+    return f"gridcapacity-shards-{solver_task_id}-done"
+
+
+@celery.task(
+    bind=True,
+    autoretry_for=(Exception,),
+    dont_autoretry_for=(RuntimeError,),
+    retry_backoff=2,
+    max_retries=1,
+)
+def run_solver(self, data: str, only_affected_buses: bool = False):
+    cfg, scenario_id = load_task_config(data, only_affected_buses)
+
     def on_progress(x: CeleryTaskMetadata):
         x.scenario_id = scenario_id
         self.update_state(state=PROGRESS, meta=x.dict(exclude_none=True))
@@ -106,12 +211,144 @@ def run_solver(self, data: str, only_affected_buses: bool = False):
     logging.info(
         f"starting powerflow calculation with config {cfg.json(exclude_none=True, exclude_unset=True)}"
     )
-    headroom_raw = calc_headroom(cfg, on_progress)
+    if HEADROOM_CHUNK_SIZE > 0:
+        writer = HeadroomWriter(scenario_id, self.request.id, HEADROOM_CHUNK_SIZE)
+        buses = writer.remaining_buses(cfg.selected_buses_ids)
+
+        if writer.persisted:
+            cfg.selected_buses_ids = buses
+            logging.info(
+                f"scenario_id={scenario_id} resuming calculation, {len(writer.persisted)} buses are done"
+            )
+
+        if GRIDCAPACITY_SHARDS > 1 and len(buses) > 1:
+            dispatch_solver_shards(self, data, scenario_id, buses, writer.persisted)
+            # progress and result of this task are reported by shards
+            raise Ignore()
+
+        if not writer.persisted or buses:
+            calc_headroom(cfg, on_progress, writer, len(writer.persisted))
 
-    headroom_model = ScenarioHeadroomSchema.parse_raw(headroom_raw)
-    save_headroom(scenario_id=scenario_id, data=headroom_model)  # type: ignore
+        writer.complete()
+    else:
+        headroom_raw = calc_headroom(cfg, on_progress)
+
+        headroom_model = ScenarioHeadroomSchema.parse_raw(headroom_raw)  # type: ignore
+        save_headroom(scenario_id=scenario_id, data=headroom_model)  # type: ignore
 
     m = CeleryTaskMetadata(
         scenario_id=scenario_id, progress=100, updated_at=int(time.time())
     )
     return m.dict(exclude_none=True)
+
+
+def dispatch_solver_shards(task, data: str, scenario_id: str, buses, persisted):
+    solver_task_id = task.request.id
+    n = min(GRIDCAPACITY_SHARDS, len(buses))
+    total = len(buses) + len(persisted)
+
+    # aggregated progress across shards
+    key = shards_progress_key(solver_task_id)
+    done_key = shards_done_key(solver_task_id)
+    task.backend.client.hset(key, mapping={"powerflows": 0})
+    if persisted:
+        task.backend.client.sadd(done_key, *persisted)
+    for k in (key, done_key):
+        task.backend.client.expire(k, task.backend.expires or 86400)
+
+    task.update_state(
+        state=PROGRESS,
+        meta=CeleryTaskMetadata(
+            scenario_id=scenario_id,
+            progress=round(len(persisted) / total * 100),
+            updated_at=int(time.time()),
+        ).dict(exclude_none=True),
+    )
+
+    header = [
+        run_solver_shard.s(data, solver_task_id, buses[i::n], total) for i in range(n)
+    ]
+    callback = complete_solver_shards.si(scenario_id, solver_task_id).on_error(
+        fail_solver_shards.s(solver_task_id)
+    )
+    chord(header)(callback)
+
+    logging.info(
+        f"scenario_id={scenario_id} calculation of {len(buses)} buses is split into {n} shards"
+    )
+
+
+@celery.task(
+    bind=True,
+    autoretry_for=(Exception,),
+    dont_autoretry_for=(RuntimeError,),
+    retry_backoff=2,
+    max_retries=1,
+)
+def run_solver_shard(
+    self, data: str, solver_task_id: str, shard_buses: List[str], total: int
+):
+    """Calculate headroom for subset of buses, on behalf of `run_solver` task"""
+    cfg, scenario_id = load_task_config(data)
+
+    writer = HeadroomWriter(scenario_id, solver_task_id, HEADROOM_CHUNK_SIZE)
+    cfg.selected_buses_ids = [x for x in shard_buses if x not in writer.persisted]
+
+    key = shards_progress_key(solver_task_id)
+    done_key = shards_done_key(solver_task_id)
+    client = self.backend.client
+    powerflows = 0
+
+    def on_headroom(x: BusHeadroomSchema):
+        writer(x)
+        pipe = client.pipeline()
+        pipe.sadd(done_key, x.bus.number)
+        pipe.expire(done_key, self.backend.expires or 86400)
+        pipe.execute()
+
+    def on_progress(x: CeleryTaskMetadata):
+        nonlocal powerflows
+
+        done = client.scard(done_key)
+        pf_total = client.hincrby(key, "powerflows", (x.powerflows or 0) - powerflows)
+        powerflows = x.powerflows or 0
+
+        meta = CeleryTaskMetadata(
+            scenario_id=scenario_id,
+            progress=min(round(done / total * 100), 99),
+            powerflows=pf_total,
+            updated_at=int(time.time()),
+        )
+        self.backend.store_result(
+            solver_task_id, meta.dict(exclude_none=True), PROGRESS
+        )
+
+    if cfg.selected_buses_ids:
+        calc_headroom(cfg, on_progress, on_headroom)
+
+    writer.flush()
+    return len(shard_buses)
+
+
+@celery.task(bind=True)
+def complete_solver_shards(self, scenario_id: str, solver_task_id: str):
+    update_solver_status(solver_task_id, states.SUCCESS)
+
+    m = CeleryTaskMetadata(
+        scenario_id=scenario_id, progress=100, updated_at=int(time.time())
+    )
+    self.backend.mark_as_done(solver_task_id, m.dict(exclude_none=True))
+    self.backend.client.delete(
+        shards_progress_key(solver_task_id), shards_done_key(solver_task_id)
+    )
+
+
+@celery.task(bind=True)
+def fail_solver_shards(self, request, exc, traceback, solver_task_id: str):
+    logging.error(f"solver_task_id={solver_task_id} shard has failed: {exc}")
+
+    update_solver_status(solver_task_id, states.FAILURE, str(exc))
+    self.backend.mark_as_failure(solver_task_id, exc)
+    self.backend.client.delete(
+        shards_progress_key(solver_task_id), shards_done_key(solver_task_id)
+    )
@@ -0,0 +1,176 @@
+import importlib.util
+import os
+import pickle
+import sys
+import tempfile
+import types
+import unittest
+
+from ..tasks import case_cache
+from ..tasks.case_cache import CaseCache, cached_case_loading
+
+
+def write(path: str, content: str, mtime_ns: int):
+    with open(path, "w") as fh:
+        fh.write(content)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+class StubLoad:
+    """Loads file content into mutable case, counting calls"""
+
+    def __init__(self, padding: int = 0):
+        self.padding = padding
+        self.calls = 0
+
+    def __call__(self, path: str):
+        self.calls += 1
+        with open(path) as fh:
+            return {"content": fh.read(), "padding": "x" * self.padding}
+
+
+def case_size(case) -> int:
+    return len(pickle.dumps(case, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class TestCaseCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.paths = [os.path.join(self.dir.name, f"case{i}.json") for i in range(3)]
+        for i, path in enumerate(self.paths):
+            write(path, f"case {i}", 10**18)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_hits_and_copies(self):
+        load = StubLoad()
+        cache = CaseCache(10**6)
+
+        first = cache.get(self.paths[0], load)
+        first["content"] = "modified by scenario"
+        second = cache.get(self.paths[0], load)
+
+        self.assertEqual(second["content"], "case 0")
+        self.assertIsNot(first, second)
+        self.assertEqual((load.calls, cache.hits, cache.misses), (1, 1, 1))
+
+        cache.get(self.paths[1], load)
+        self.assertEqual((load.calls, cache.hits, cache.misses), (2, 1, 2))
+
+    def test_rewritten_file(self):
+        load = StubLoad()
+        cache = CaseCache(10**6)
+        cache.get(self.paths[0], load)
+
+        # same size, new mtime
+        write(self.paths[0], "case 9", 10**18 + 1)
+        self.assertEqual(cache.get(self.paths[0], load)["content"], "case 9")
+
+        # same mtime, new size
+        write(self.paths[0], "case 10", 10**18 + 1)
+        self.assertEqual(cache.get(self.paths[0], load)["content"], "case 10")
+
+        self.assertEqual((load.calls, cache.misses), (3, 3))
+        # stale versions are dropped, not kept until evicted
+        self.assertEqual(len(cache.items), 1)
+
+    def test_variants(self):
+        load = StubLoad()
+        cache = CaseCache(10**6)
+
+        cache.get(self.paths[0], load, variant="a")
+        cache.get(self.paths[0], load, variant="b")
+        cache.get(self.paths[0], load, variant="a")
+        self.assertEqual((load.calls, cache.hits, cache.misses), (2, 1, 2))
+        self.assertEqual(len(cache.items), 2)
+
+    def test_size_bound(self):
+        load = StubLoad(padding=1000)
+        size = case_size(load(self.paths[0]))
+        cache = CaseCache(2 * size + size // 2)
+
+        for path in self.paths:
+            cache.get(path, load)
+
+        # least recently used case is evicted
+        self.assertEqual([k[0] for k in cache.items], self.paths[1:])
+        self.assertEqual(cache.total_bytes, 2 * size)
+        self.assertLessEqual(cache.total_bytes, cache.max_bytes)
+
+        cache.get(self.paths[1], load)
+        cache.get(self.paths[0], load)
+        self.assertEqual([k[0] for k in cache.items], [self.paths[1], self.paths[0]])
+
+    def test_oversize_skipped(self):
+        load = StubLoad(padding=1000)
+        cache = CaseCache(100)
+
+        cache.get(self.paths[0], load)
+        cache.get(self.paths[0], load)
+
+        self.assertEqual((load.calls, cache.hits, cache.misses), (2, 0, 2))
+        self.assertEqual((len(cache.items), cache.total_bytes), (0, 0))
+
+
+class CaseFileTestCase(unittest.TestCase):
+    """pandapower case file served by fresh case cache"""
+
+    def setUp(self):
+        import pandapower
+        import pandapower.networks
+
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "case.json")
+        pandapower.to_json(pandapower.networks.example_simple(), self.path)
+
+        self.cache = CaseCache(10**9)
+        self.original_cache = case_cache.case_cache
+        case_cache.case_cache = self.cache
+
+    def tearDown(self):
+        case_cache.case_cache = self.original_cache
+        self.dir.cleanup()
+
+
+@unittest.skipUnless(importlib.util.find_spec("pandapower"), "requires pandapower")
+class TestCachedCaseLoading(CaseFileTestCase):
+    def test_imported_by_name(self):
+        import pandapower
+
+        # as by `from pandapower import from_json` in gridcapacity
+        holder = types.ModuleType("gridcapacity._test_holder")
+        holder.from_json = pandapower.from_json  # type: ignore
+        sys.modules[holder.__name__] = holder
+        try:
+            for _ in range(2):
+                with cached_case_loading():
+                    holder.from_json(self.path)  # type: ignore
+                    holder.from_json(self.path, convert=False)  # type: ignore
+        finally:
+            del sys.modules[holder.__name__]
+
+        self.assertIs(holder.from_json, pandapower.from_json)  # type: ignore
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+
+    def test_bypassed(self):
+        with self.assertLogs(level="WARNING"):
+            with cached_case_loading():
+                pass
+
+
+@unittest.skipUnless(importlib.util.find_spec("gridcapacity"), "requires gridcapacity")
+class TestCalcHeadroomCaseCache(CaseFileTestCase):
+    def runTest(self):
+        from ..headroom.schemas import GridCapacityConfig
+        from ..tasks.gridcapacity_task import calc_headroom
+
+        cfg = GridCapacityConfig(case_name=self.path)
+
+        calc_headroom(cfg, on_progress=lambda _: None)
+        self.assertEqual(self.cache.hits, 0)
+        self.assertGreater(self.cache.misses, 0)
+
+        # second calculation gets the case from cache, not from disk
+        calc_headroom(cfg, on_progress=lambda _: None)
+        self.assertGreater(self.cache.hits, 0)
@@ -0,0 +1,47 @@
+import unittest
+
+import h3
+
+from ..connections.h3index import (
+    H3_KEY_RESOLUTION,
+    h3_key,
+    h3_key_range,
+    h3_parent_key_mask,
+)
+
+POINTS = [(59.3293, 18.0686), (67.8558, 20.2253), (55.6050, 13.0038), (0.0, 0.0)]
+
+
+class TestH3KeyRange(unittest.TestCase):
+    def runTest(self):
+        for lat, lon in POINTS:
+            key = h3_key(lat, lon)
+            cell15 = h3.h3_to_string(key)
+            self.assertEqual(h3.h3_get_resolution(cell15), H3_KEY_RESOLUTION)
+
+            for res in range(H3_KEY_RESOLUTION + 1):
+                parent = h3.h3_to_parent(cell15, res)
+                first, last = h3_key_range(parent)
+                self.assertTrue(first <= key <= last, (lat, lon, res))
+
+                # cells next to parent have their keys outside of its range
+                for neighbour in h3.k_ring(parent, 1) - {parent}:
+                    child = h3.h3_to_center_child(neighbour, H3_KEY_RESOLUTION)
+                    other = h3.string_to_h3(child)
+                    self.assertFalse(first <= other <= last, (lat, lon, res))
+
+
+class TestH3ParentKeyMask(unittest.TestCase):
+    def runTest(self):
+        for lat, lon in POINTS:
+            key = h3_key(lat, lon)
+            cell15 = h3.h3_to_string(key)
+
+            for res in range(H3_KEY_RESOLUTION + 1):
+                keep, set_ = h3_parent_key_mask(res)
+                # masks are used in SQL on BIGINT
+                self.assertTrue(-(2**63) <= keep < 2**63)
+                self.assertTrue(0 <= set_ < 2**63)
+
+                parent = (key & keep) | set_
+                self.assertEqual(h3.h3_to_string(parent), h3.h3_to_parent(cell15, res))
@@ -0,0 +1,52 @@
+import unittest
+
+from ..datadump import projections
+from ..datadump.xlsx_importer import COORD_KEYS, _normalize_coords, logger
+
+GEODETIC = [(55.3617, 11.0), (59.3293, 18.0686), (63.8258, 20.263), (69.06, 24.1)]
+GRID = [(6137000.0, 376000.0), (6580822.0, 674032.0), (7310000.0, 915000.0)]
+
+
+class TestProjections(unittest.TestCase):
+    def runTest(self):
+        lat, lon = zip(*GEODETIC)
+        northing, easting = projections.geodetic_to_grid(lat, lon)
+        for i, (x, y) in enumerate(GEODETIC):
+            n, e = projections.tm.geodetic_to_grid(x, y)
+            self.assertAlmostEqual(northing[i], n, places=4)
+            self.assertAlmostEqual(easting[i], e, places=4)
+
+        northing, easting = zip(*GRID)
+        lat, lon = projections.grid_to_geodetic(northing, easting)
+        for i, (n, e) in enumerate(GRID):
+            x, y = projections.tm.grid_to_geodetic(n, e)
+            self.assertAlmostEqual(lat[i], x, places=9)
+            self.assertAlmostEqual(lon[i], y, places=9)
+
+
+class TestNormalizeCoords(unittest.TestCase):
+    def runTest(self):
+        grid = {"sweref99tmNorthing": "6580822.7", "sweref99tmEasting": 674032}
+        geodetic = {"wsg84lat": 59.3293, "wsg84lon": "18.0686", "other": 1}
+        missing = {"sweref99tmNorthing": "", "wsg84lat": None, "wsg84lon": 0}
+
+        with self.assertLogs(logger, "ERROR"):
+            result = _normalize_coords([grid, geodetic, missing])
+        self.assertEqual([list(x) for x in result], [COORD_KEYS] * 3)
+
+        # grid only, truncated to whole metres
+        lat, lon = projections.tm.grid_to_geodetic(6580822, 674032)
+        self.assertEqual(result[0]["sweref99tmNorthing"], "6580822.7")
+        self.assertEqual(result[0]["sweref99tmEasting"], 674032)
+        self.assertAlmostEqual(result[0]["wsg84lat"], lat, places=9)
+        self.assertAlmostEqual(result[0]["wsg84lon"], lon, places=9)
+
+        # geodetic only
+        n, e = projections.tm.geodetic_to_grid(59.3293, 18.0686)
+        self.assertAlmostEqual(result[1]["sweref99tmNorthing"], n, places=4)
+        self.assertAlmostEqual(result[1]["sweref99tmEasting"], e, places=4)
+        self.assertEqual(result[1]["wsg84lat"], 59.3293)
+        self.assertEqual(result[1]["wsg84lon"], "18.0686")
+
+        # missing coordinates
+        self.assertEqual(result[2], dict.fromkeys(COORD_KEYS, 0))
@@ -0,0 +1,89 @@
+import unittest
+import uuid
+from typing import Optional
+
+from sqlalchemy import Delete, Insert, Select, Update
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from ..database.helpers import sync_rows
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class Item(Base):
+    __tablename__ = "item"
+
+    id: Mapped[uuid.UUID] = mapped_column(primary_key=True)
+    a: Mapped[str]
+    b: Mapped[Optional[str]]
+    value: Mapped[int]
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    """Returns preset rows for SELECT, records other statements"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    async def execute(self, stmt, params=None):
+        self.statements.append((stmt, params))
+        return FakeResult(self.rows if isinstance(stmt, Select) else [])
+
+    def of_type(self, cls):
+        return [(s, p) for s, p in self.statements if isinstance(s, cls)]
+
+
+class TestSyncRows(unittest.IsolatedAsyncioTestCase):
+    async def runTest(self):
+        kept, changed, dup1, dup2, stale = (uuid.uuid4() for _ in range(5))
+        session = FakeSession(
+            [
+                (kept, "x", None, 1),
+                (changed, "y", "1", 1),
+                (dup1, "z", "1", 1),
+                (dup2, "z", "1", 1),
+                (stale, "w", None, 1),
+            ]
+        )
+        rows = [
+            {"a": "x", "b": None, "value": 1},  # unchanged, NULL key matches
+            {"a": "y", "b": "1", "value": 2},  # updated
+            {"a": "z", "b": "1", "value": 1},  # one of duplicates kept
+            {"a": "new", "b": None, "value": 1},  # inserted
+        ]
+
+        counts = await sync_rows(
+            session, Item, rows, key=("a", "b"), scope=Item.a.is_not(None)
+        )
+        self.assertEqual(counts, {"inserted": 1, "updated": 1, "deleted": 2})
+
+        ((update, _),) = session.of_type(Update)
+        self.assertIn("UPDATE item SET value=v.value FROM", str(update))
+        self.assertEqual(list(update.compile().params.values()), [changed, 2])
+
+        ((delete, _),) = session.of_type(Delete)
+        self.assertEqual(delete.whereclause.right.value, [dup1, stale])
+
+        ((_, inserted),) = session.of_type(Insert)
+        self.assertEqual(inserted, [{"a": "new", "b": None, "value": 1}])
+
+
+class TestSyncRowsEmpty(unittest.IsolatedAsyncioTestCase):
+    async def runTest(self):
+        stale = uuid.uuid4()
+        session = FakeSession([(stale, "x")])
+
+        counts = await sync_rows(session, Item, [], key=("a",), scope=Item.a == "x")
+        self.assertEqual(counts, {"inserted": 0, "updated": 0, "deleted": 1})
+        self.assertFalse(session.of_type(Update) or session.of_type(Insert))